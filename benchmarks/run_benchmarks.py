@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite: ingest, series, city list, dashboard pages and the JSON API they load
+
+Generates a synthetic upload, ingests it into a temporary SQLite database and
+times the hot paths through the Flask test client. Results are written as
+JSON; pass --compare with an earlier results file to see the change per
+benchmark.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Add repository root to Python path
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic_data import write_csv
+
+def _summary(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "runs": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(pick(0.5) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "min_ms": round(ordered[0] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def _time(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return _summary(samples)
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _get(client, url):
+    response = client.get(url)
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {url} returned {response.status_code}")
+    return response
+
+def run(cities, weeks, repeat, seed, workdir):
+    # The database location is read from the environment when config is imported
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models import db, City, User
+    from services import forecasting, kepler
+    from services.csv_loader import get_city_series, load_csv
+
+    csv_path = os.path.join(workdir, "synthetic.csv")
+    started = time.perf_counter()
+    rows = write_csv(csv_path, cities, weeks, seed)
+    generate_seconds = time.perf_counter() - started
+
+    app = create_app()
+    app.config.update(TESTING=True, INGEST_ASYNC=False, UPLOAD_FOLDER=os.path.join(workdir, "uploads"),
+                      JOB_FOLDER=os.path.join(workdir, "jobs"))
+    results = {}
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username="bench", password_hash=generate_password_hash("bench")))
+        db.session.commit()
+
+        with open(csv_path, "rb") as fh:
+            results["load_csv"] = _time(lambda: load_csv(FileStorage(fh, filename="synthetic.csv")), 1)
+
+        city_ids = [c.id for c in City.query.order_by(City.id).limit(repeat).all()]
+        sample = (city_ids * repeat)[:repeat]
+
+        def series_cold():
+            forecasting._forecast_cache.clear()
+            get_city_series(sample[0])
+        results["get_city_series_cold"] = _time(series_cold, repeat)
+        results["get_city_series_warm"] = _time(lambda: get_city_series(sample[0]), repeat)
+
+        def payload_cold():
+            kepler._payload_cache.clear()
+            city = db.session.get(City, sample[0])
+            kepler.build_kepler_payload(city, city.latest_indicator)
+        results["kepler_payload_cold"] = _time(payload_cold, repeat)
+
+    client = app.test_client()
+    client.post("/login", data={"username": "bench", "password": "bench"})
+    results["list_cities"] = _time(lambda: _get(client, "/cities/"), repeat)
+    ids = iter(sample * 2)
+    results["dashboard"] = _time(lambda: _get(client, f"/dashboard/{next(ids)}"), repeat)
+    ids = iter(sample * 2)
+    results["kepler_view"] = _time(lambda: _get(client, f"/dashboard/{next(ids)}/kepler"), repeat)
+    # The dashboard and Kepler pages are shells; their data comes from these endpoints
+    ids = iter(sample * 2)
+    results["api_series"] = _time(lambda: _get(client, f"/api/cities/{next(ids)}/series"), repeat)
+    ids = iter(sample * 2)
+    results["api_kepler"] = _time(lambda: _get(client, f"/api/cities/{next(ids)}/kepler"), repeat)
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "params": {"cities": cities, "weeks": weeks, "rows": rows, "repeat": repeat, "seed": seed},
+        "generate_seconds": round(generate_seconds, 3),
+        "results": results,
+    }
+
+def compare(current, baseline):
+    """Print mean time per benchmark against an earlier run"""
+    print(f"{'benchmark':<24}{'baseline ms':>14}{'current ms':>14}{'change':>10}")
+    for name, stats in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            print(f"{name:<24}{'-':>14}{stats['mean_ms']:>14.3f}{'new':>10}")
+            continue
+        change = (stats["mean_ms"] / before["mean_ms"] - 1) * 100 if before["mean_ms"] else 0.0
+        print(f"{name:<24}{before['mean_ms']:>14.3f}{stats['mean_ms']:>14.3f}{change:>+9.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cities", type=int, default=200)
+    parser.add_argument("--weeks", type=int, default=104)
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per benchmark (load_csv runs once)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="sante-bench-") as workdir:
+        report = run(args.cities, args.weeks, args.repeat, args.seed, workdir)
+    with open(args.output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+
+    for name, stats in report["results"].items():
+        print(f"{name:<24} mean {stats['mean_ms']:>10.3f} ms   p95 {stats['p95_ms']:>10.3f} ms")
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as fh:
+            compare(report, json.load(fh))
+
+if __name__ == "__main__":
+    main()
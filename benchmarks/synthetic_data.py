@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Synthetic epidemiological CSV generator for benchmarks
+
+Writes N cities x M weeks of noisy outbreak curves in the upload format
+(city,state,country,week_label,cases), one city at a time so memory stays
+flat for large files.
+"""
+
+import argparse
+import csv
+import numpy as np
+
+COUNTRIES = ["Brazil", "United States", "Sierra Leone", "India", "Mexico", "Nigeria"]
+# First ISO-style label is FIRST_YEAR-W01; seasons are 52 weeks long
+FIRST_YEAR = 2020
+SEASON_WEEKS = 52
+
+def week_labels(weeks):
+    """'2020-W01', '2020-W02', ... continuing across years"""
+    idx = np.arange(weeks)
+    return [f"{FIRST_YEAR + i // SEASON_WEEKS}-W{i % SEASON_WEEKS + 1:02d}" for i in idx]
+
+def outbreak_curve(rng, weeks):
+    """Expected weekly cases: seasonal baseline plus 1-3 epidemic waves"""
+    t = np.arange(weeks, dtype="float64")
+    baseline = rng.uniform(5, 50)
+    curve = baseline * (1 + 0.3 * np.sin(2 * np.pi * (t / SEASON_WEEKS + rng.uniform())))
+    for _ in range(rng.integers(1, 4)):
+        peak_week = rng.uniform(0, weeks)
+        width = rng.uniform(3, 12)
+        height = rng.lognormal(mean=6, sigma=1)
+        curve += height * np.exp(-0.5 * ((t - peak_week) / width) ** 2)
+    return curve
+
+def noisy_cases(rng, curve, dispersion=10.0):
+    """Negative-binomial counts around ``curve`` (gamma-Poisson mixture)"""
+    return rng.poisson(rng.gamma(dispersion, curve / dispersion))
+
+def write_csv(path, cities, weeks, seed=0):
+    """Write the synthetic upload to ``path``; returns the number of data rows"""
+    rng = np.random.default_rng(seed)
+    labels = week_labels(weeks)
+    with open(path, "w", newline="", encoding="utf-8") as fh:
+        writer = csv.writer(fh)
+        writer.writerow(["city", "state", "country", "week_label", "cases"])
+        for i in range(cities):
+            name, state, country = f"City {i:05d}", f"S{i % 27:02d}", COUNTRIES[i % len(COUNTRIES)]
+            cases = noisy_cases(rng, outbreak_curve(rng, weeks))
+            writer.writerows((name, state, country, label, int(c)) for label, c in zip(labels, cases))
+    return cities * weeks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path", help="CSV file to write")
+    parser.add_argument("--cities", type=int, default=100)
+    parser.add_argument("--weeks", type=int, default=104)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rows = write_csv(args.path, args.cities, args.weeks, args.seed)
+    print(f"Wrote {rows} rows ({args.cities} cities x {args.weeks} weeks) to {args.path}")
+
+if __name__ == "__main__":
+    main()
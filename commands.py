@@ -0,0 +1,96 @@
+import time
+import click
+from models import db
+from services.city_summary import refresh_summaries
+from services.csv_loader import forecast_all_cities, recompute_indicators
+from services.forecasting import FORECAST_MODELS
+from services.gazetteer import geocode_cities, load_places
+from services.migrations import upgrade_db
+from services.report_batch import generate_reports, write_reports_zip
+from services.report_store import clear_reports
+from services.series_store import rebuild_series
+
+def register_commands(app):
+    """Register maintenance CLI commands (run with ``flask <command>``)"""
+
+    @app.cli.command("upgrade-db")
+    def upgrade_db_command():
+        """Add new columns/indexes to an existing database and backfill them"""
+        with app.app_context():
+            result = upgrade_db()
+            print(f"Database upgraded ({result['week_idx_backfilled']} observations and "
+                  f"{result['latest_indicators_backfilled']} cities backfilled, "
+                  f"{result['cities_geocoded']} cities geocoded, "
+                  f"{result['indicators_enriched']} indicators enriched, "
+                  f"{result['series_packed']} series packed, "
+                  f"{result['cities_summarized']} cities summarized).")
+
+    @app.cli.command("load-gazetteer")
+    @click.argument("path", required=False)
+    @click.option("--all", "regeocode", is_flag=True, help="Re-resolve cities that already have coordinates")
+    def load_gazetteer_command(path, regeocode):
+        """Load a place file (default: the bundled gazetteer) and geocode cities"""
+        with app.app_context():
+            places = load_places(path)
+            geocoded = geocode_cities(overwrite=regeocode)
+            refresh_summaries()
+            db.session.commit()
+            print(f"Loaded {places} places; {geocoded} cities geocoded.")
+
+    @app.cli.command("recompute-indicators")
+    def recompute_indicators_command():
+        """Recompute every city's indicators in one batch"""
+        with app.app_context():
+            started = time.perf_counter()
+            cities = recompute_indicators()
+            db.session.commit()
+            print(f"Recomputed indicators for {cities} cities in {time.perf_counter() - started:.2f}s.")
+
+    @app.cli.command("forecast-cities")
+    @click.option("--model", type=click.Choice(sorted(FORECAST_MODELS)), help="Defaults to FORECAST_MODEL")
+    @click.option("--horizon", type=int, help="Weeks ahead (defaults to FORECAST_HORIZON)")
+    def forecast_cities_command(model, horizon):
+        """Batch-forecast every city and print the next week's point forecast"""
+        with app.app_context():
+            started = time.perf_counter()
+            forecasts = forecast_all_cities(model=model, horizon=horizon)
+            elapsed = time.perf_counter() - started
+            for city_id, forecast in sorted(forecasts.items()):
+                print(f"{city_id}\t{forecast['point'][0]}\t[{forecast['lower'][0]}, {forecast['upper'][0]}]")
+            print(f"Forecast {len(forecasts)} cities in {elapsed:.2f}s.")
+
+    @app.cli.command("rebuild-series")
+    @click.option("--city", "city_ids", type=int, multiple=True, help="Limit to these city ids (repeatable)")
+    def rebuild_series_command(city_ids):
+        """Re-pack per-city series from the Observation table"""
+        with app.app_context():
+            started = time.perf_counter()
+            packed = rebuild_series(list(city_ids) or None)
+            db.session.commit()
+            print(f"Packed {packed} city series in {time.perf_counter() - started:.2f}s.")
+
+    @app.cli.command("clear-report-cache")
+    @click.option("--city", "city_id", type=int, help="Only drop this city's reports")
+    def clear_report_cache_command(city_id):
+        """Drop stored dispatch reports so the next request calls the LLM again"""
+        with app.app_context():
+            print(f"Removed {clear_reports(city_id)} cached reports.")
+
+    @app.cli.command("generate-reports")
+    @click.option("--city", "city_ids", type=int, multiple=True, help="Limit to these city ids (repeatable)")
+    @click.option("--concurrency", type=int, help="API calls in flight (defaults to REPORT_BATCH_CONCURRENCY)")
+    @click.option("--regenerate", is_flag=True, help="Ignore stored reports")
+    @click.option("--zip", "zip_path", type=click.Path(dir_okay=False), help="Also write the reports to this zip file")
+    def generate_reports_command(city_ids, concurrency, regenerate, zip_path):
+        """Generate dispatch reports for many cities concurrently into the report store"""
+        with app.app_context():
+            result = generate_reports(list(city_ids) or None, regenerate=regenerate, concurrency=concurrency,
+                                      progress=lambda done, total: print(f"\r{done}/{total} cities", end=""))
+            print()
+            for city_id, error in sorted(result["errors"].items()):
+                print(f"City {city_id} failed: {error}")
+            if zip_path:
+                with open(zip_path, "wb") as fh:
+                    write_reports_zip(result["reports"], fh)
+            print(f"{result['generated']} generated, {result['cached']} cached, {result['failed']} failed "
+                  f"in {result['seconds']:.2f}s.")
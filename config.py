@@ -7,5 +7,46 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "static", "uploads")
     ALLOWED_EXTENSIONS = {"csv"}
+    INGEST_CHUNK_ROWS = int(os.environ.get("INGEST_CHUNK_ROWS", 50000))
+    # Uploads are processed by a background job unless INGEST_ASYNC=0
+    INGEST_ASYNC = os.environ.get("INGEST_ASYNC", "1") != "0"
+    JOB_FOLDER = os.path.join(BASE_DIR, "instance", "jobs")
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+    # Seconds finished jobs and their files (e.g. report zips) are kept
+    JOB_RETENTION = int(os.environ.get("JOB_RETENTION", 86400))
+    # Place file used to geocode cities (defaults to the bundled static/gazetteer.csv)
+    GAZETTEER_PATH = os.environ.get("GAZETTEER_PATH")
+    # R(t) estimation: serial interval mean/sd in weeks and weeks pooled per estimate
+    RT_SI_MEAN = float(os.environ.get("RT_SI_MEAN", 2.0))
+    RT_SI_SD = float(os.environ.get("RT_SI_SD", 1.0))
+    RT_WINDOW = int(os.environ.get("RT_WINDOW", 3))
+    # Forecasting: holt, loglinear or seasonal_naive; weeks ahead; interval coverage
+    FORECAST_MODEL = os.environ.get("FORECAST_MODEL", "holt")
+    FORECAST_HORIZON = int(os.environ.get("FORECAST_HORIZON", 3))
+    FORECAST_INTERVAL = float(os.environ.get("FORECAST_INTERVAL", 0.8))
+    # Request/SQL/OpenAI timings on /metrics; requests slower than SLOW_REQUEST_MS (0 = off) log their queries
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+    # /metrics requires a logged-in user unless METRICS_PUBLIC=1 (e.g. for a Prometheus scraper on a private network)
+    METRICS_PUBLIC = os.environ.get("METRICS_PUBLIC", "0") == "1"
+    SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 0))
+    # Weeks the series API returns per request (LTTB-downsampled beyond this; 0 = full resolution)
+    SERIES_MAX_POINTS = int(os.environ.get("SERIES_MAX_POINTS", 300))
+    CITIES_PAGE_SIZE = int(os.environ.get("CITIES_PAGE_SIZE", 24))
+    # National map: zoom from which cities are sent one by one instead of clustered, cap per viewport
+    MAP_CLUSTER_MAX_ZOOM = int(os.environ.get("MAP_CLUSTER_MAX_ZOOM", 11))
+    MAP_MAX_CITIES = int(os.environ.get("MAP_MAX_CITIES", 2000))
     OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
     OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+    # Shared OpenAI client: alternate endpoint (e.g. a local stub), pooled connections, seconds, retries
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+    OPENAI_POOL_SIZE = int(os.environ.get("OPENAI_POOL_SIZE", 10))
+    OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", 60))
+    OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", 2))
+    # Generated reports are reused for identical inputs: lifetime in seconds, max stored
+    REPORT_CACHE_TTL = int(os.environ.get("REPORT_CACHE_TTL", 7 * 24 * 3600))
+    REPORT_CACHE_MAX_ENTRIES = int(os.environ.get("REPORT_CACHE_MAX_ENTRIES", 500))
+    # Batch reports: API calls in flight (capped at OPENAI_POOL_SIZE), extra retries on rate limits
+    REPORT_BATCH_CONCURRENCY = int(os.environ.get("REPORT_BATCH_CONCURRENCY", 8))
+    REPORT_BATCH_RETRIES = int(os.environ.get("REPORT_BATCH_RETRIES", 5))
+    # Batch jobs run on their own workers so uploads never wait behind them
+    REPORT_BATCH_WORKERS = int(os.environ.get("REPORT_BATCH_WORKERS", 1))
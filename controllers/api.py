@@ -0,0 +1,162 @@
+import hashlib
+import json
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+from flask_login import login_required
+from models import db, City, Indicator
+from services.city_summary import RISK_LEVELS, SORT_KEYS, national_overview, summary_dict, summary_page
+from services.downsample import lttb_indices, window_slice
+from services.forecasting import city_forecast, forecast_settings
+from services.kepler import build_kepler_payload
+from services.rt_estimator import as_chart_series, estimate_rt, rt_settings
+from services import series_store
+from services.spatial import DEFAULT_CLUSTER_MAX_ZOOM, DEFAULT_MAX_CITIES, parse_bbox, viewport
+
+api_bp = Blueprint("api", __name__, url_prefix="/api")
+
+# Weeks returned by the series endpoint unless ``points`` says otherwise
+DEFAULT_MAX_POINTS = 300
+# City summaries per page of /api/cities
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def _settings_tag(*settings):
+    """Short hash of the model settings an endpoint's output depends on"""
+    blob = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()[:10]
+
+def _conditional(city, kind, build, settings=()):
+    """Serve ``build()`` as JSON under a strong ETag; 304 when the client already has it.
+
+    The tag changes whenever the city's data version, latest indicator or the
+    relevant settings change, so the payload is only built for stale clients.
+    """
+    etag = f"{kind}-{city.id}-{city.data_version}-{city.latest_indicator_id or 0}-{_settings_tag(*settings)}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    # Always revalidate; an unchanged city costs one version check
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+@api_bp.route("/cities")
+@login_required
+def cities():
+    """Ranked city summaries: ?sort=recent|rt|growth|cases, ?risk=, ?country=, ?limit=, ?after=<city id>"""
+    sort = request.args.get("sort", "recent")
+    if sort not in SORT_KEYS:
+        abort(400, f"sort must be one of {', '.join(SORT_KEYS)}")
+    risk = request.args.get("risk")
+    if risk is not None and risk not in RISK_LEVELS:
+        abort(400, f"risk must be one of {', '.join(RISK_LEVELS)}")
+    limit = min(max(request.args.get("limit", DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    rows, next_after = summary_page(sort, risk=risk, country=request.args.get("country"),
+                                    after=request.args.get("after", type=int), limit=limit)
+    return jsonify({"sort": sort, "cities": [summary_dict(city, summary) for city, summary in rows],
+                    "next_after": next_after})
+
+@api_bp.route("/overview")
+@login_required
+def overview():
+    """City counts, latest-week cases and mean R(t) per risk level (optionally ?country=)"""
+    return jsonify(national_overview(request.args.get("country")))
+
+@api_bp.route("/map")
+@login_required
+def national_map():
+    """Cities inside ?bbox=west,south,east,north at ?zoom=, clustered by geohash cell at low zoom (?risk= filters)"""
+    try:
+        bbox = parse_bbox(request.args.get("bbox", "-180,-90,180,90"))
+    except ValueError as e:
+        abort(400, str(e))
+    zoom = request.args.get("zoom", 0, type=int)
+    risk = request.args.get("risk")
+    if risk is not None and risk not in RISK_LEVELS:
+        abort(400, f"risk must be one of {', '.join(RISK_LEVELS)}")
+    result = viewport(bbox, zoom, risk=risk,
+                      max_zoom=current_app.config.get("MAP_CLUSTER_MAX_ZOOM", DEFAULT_CLUSTER_MAX_ZOOM),
+                      max_cities=current_app.config.get("MAP_MAX_CITIES", DEFAULT_MAX_CITIES))
+    return jsonify({"bbox": list(bbox), "zoom": zoom, "risk": risk, **result})
+
+@api_bp.route("/cities/<int:city_id>/series")
+@login_required
+def city_series(city_id):
+    """Weekly cases, the forecast and the R(t) series with its band, column-wise.
+
+    ``from``/``to`` (positions in the full series, inclusive; ``positions``
+    in a response gives them per week) select a window and ``points`` caps
+    how many weeks are returned (LTTB downsampling on the cases;
+    ``points=0`` is full resolution, 1 and 2 are rejected). R(t) is
+    estimated over the whole series before windowing, and the forecast
+    always continues the last week.
+    """
+    city = City.query.get_or_404(city_id)
+    start, end = request.args.get("from", type=int), request.args.get("to", type=int)
+    points = request.args.get("points", type=int)
+    if points is None:
+        points = current_app.config.get("SERIES_MAX_POINTS", DEFAULT_MAX_POINTS)
+    if points < 0 or 0 < points < 3:
+        # LTTB always keeps both endpoints plus at least one bucket
+        abort(400, "points must be 0 (full resolution) or at least 3")
+    # Validated before the ETag check, so a bad window is a 400 even for a cached client
+    packed = series_store.city_series(city_id)
+    labels = packed.labels
+    try:
+        window = window_slice(len(labels), start, end)
+    except ValueError as e:
+        abort(400, str(e))
+
+    def build():
+        values = packed.cases.tolist()
+        forecast = city_forecast(city, values)
+        rt = estimate_rt(packed.cases)
+        cases = values[window]
+        keep = lttb_indices(cases, points) if points else range(len(cases))
+        positions = [window.start + int(i) for i in keep]
+        return {
+            "city_id": city.id,
+            "version": city.data_version,
+            "total_weeks": len(labels),
+            "window": {"from": labels[window][0] if cases else None,
+                       "to": labels[window][-1] if cases else None,
+                       "start": window.start,
+                       "weeks": len(cases),
+                       # Whether the window runs to the latest week (where the forecast starts)
+                       "latest": window.stop == len(labels)},
+            "downsampled": len(positions) < len(cases),
+            "positions": positions,
+            "weeks": [labels[i] for i in positions],
+            "cases": [values[i] for i in positions],
+            "forecast": forecast,
+            "rt": as_chart_series({key: series[positions] for key, series in rt.items()}),
+        }
+    return _conditional(city, "series", build, (forecast_settings(), rt_settings(), start, end, points))
+
+@api_bp.route("/cities/<int:city_id>/indicators")
+@login_required
+def city_indicators(city_id):
+    """Latest indicator plus the full indicator history, column-wise (oldest first)"""
+    city = City.query.get_or_404(city_id)
+
+    def build():
+        table = Indicator.__table__
+        rows = db.session.execute(
+            table.select().where(table.c.city_id == city_id).order_by(table.c.id)
+        ).all()
+        columns = ["id", "rt", "r0", "hospitalization_rate", "risk_level", "severity_score", "computed_at"]
+        history = {column: [getattr(r, column) for r in rows] for column in columns}
+        history["computed_at"] = [c.isoformat() if c else None for c in history["computed_at"]]
+        latest = None
+        if city.latest_indicator_id in history["id"]:
+            i = history["id"].index(city.latest_indicator_id)
+            latest = {column: history[column][i] for column in columns}
+        return {"city_id": city.id, "version": city.data_version, "latest": latest, "history": history}
+    return _conditional(city, "indicators", build)
+
+@api_bp.route("/cities/<int:city_id>/kepler")
+@login_required
+def city_kepler(city_id):
+    """Columnar Kepler.gl payload (constants once, per-week arrays), see services.kepler"""
+    city = City.query.get_or_404(city_id)
+    return _conditional(city, "kepler", lambda: build_kepler_payload(city, city.latest_indicator))
@@ -1,21 +1,58 @@
 import os
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, abort
 from flask_login import login_required
 from werkzeug.utils import secure_filename
-from models import db, City, Indicator
-from services.csv_loader import load_csv
+from models import db, City
+from services.city_summary import RISK_LEVELS, SORT_KEYS, summary_page
+from services.csv_loader import ingest_csv, INGEST_MODES
+from services.jobs import get_queue
 
 cities_bp = Blueprint("cities", __name__, url_prefix="/cities")
 
 def _allowed_file(filename):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in {"csv"}
 
+def _ingest_job(job_id, path, mode, filename):
+    """Background job body: ingest a saved upload and report progress"""
+    queue = get_queue()
+    try:
+        city_ids, stats = ingest_csv(path, mode=mode, filename=filename,
+                                     progress=lambda phase, rows: queue.progress(job_id, phase, rows))
+    finally:
+        # The saved upload only exists to hand the file to this job
+        os.remove(path)
+    return {"city_ids": city_ids[:1], "stats": stats}
+
+def _flash_ingest_result(city_ids, stats):
+    """Flash the outcome of an ingest and return where to send the user"""
+    if stats.get("skipped"):
+        flash(f"This file was already uploaded ({stats['duplicate_of']}); nothing to update.", "info")
+        return url_for("cities.list_cities")
+    if stats["cities"] > 1:
+        flash(f"{stats['cities']} cities processed "
+              f"({stats['rows']} rows, {stats['rows_per_sec']} rows/sec).", "success")
+        return url_for("cities.list_cities")
+    city = db.session.get(City, city_ids[0])
+    flash(f"City '{city.name}' processed and dashboard created "
+          f"({stats['rows']} rows, {stats['rows_per_sec']} rows/sec).", "success")
+    return url_for("dashboard.view_city", city_id=city.id)
+
 @cities_bp.route("/")
 @login_required
 def list_cities():
-    cities = City.query.order_by(City.created_at.desc()).all()
-    ind_map = {i.city_id: i for i in Indicator.query.all()}
-    return render_template("city_list.html", cities=cities, ind_map=ind_map)
+    # Keyset pagination over the summary table: ?sort= ranking (newest first by
+    # default), ?risk= filter, ?after=<city id> continues after that city
+    page_size = current_app.config.get("CITIES_PAGE_SIZE", 24)
+    sort = request.args.get("sort", "recent")
+    if sort not in SORT_KEYS:
+        sort = "recent"
+    risk = request.args.get("risk")
+    if risk not in RISK_LEVELS:
+        risk = None
+    after = request.args.get("after", type=int)
+    rows, next_after = summary_page(sort, risk=risk, after=after, limit=page_size)
+    return render_template("city_list.html", rows=rows, next_after=next_after, paged=after is not None,
+                           sort=sort, risk=risk, sorts=list(SORT_KEYS), risk_levels=RISK_LEVELS)
 
 @cities_bp.route("/upload", methods=["GET", "POST"])
 @login_required
@@ -28,19 +65,69 @@ def upload():
         if not _allowed_file(file.filename):
             flash("Invalid file type. Please upload a CSV.", "danger")
             return redirect(request.url)
+        mode = request.form.get("mode", "replace")
+        if mode not in INGEST_MODES:
+            flash("Invalid upload mode.", "danger")
+            return redirect(request.url)
         filename = secure_filename(file.filename)
-        upload_path = os.path.join(current_app.config["UPLOAD_FOLDER"])
-        os.makedirs(upload_path, exist_ok=True)
-        # Save a copy (optional)
-        file.seek(0)
-        file.save(os.path.join(upload_path, filename))
-        file.stream.seek(0)  # rewind for parsing
+
+        if current_app.config.get("INGEST_ASYNC", True):
+            # Save the upload and hand it to a background job; respond immediately
+            upload_path = os.path.join(current_app.config["UPLOAD_FOLDER"])
+            os.makedirs(upload_path, exist_ok=True)
+            queue = get_queue()
+            job = queue.create("ingest", filename=filename, mode=mode)
+            saved_path = os.path.join(upload_path, f"{job['id']}-{filename}")
+            file.save(saved_path)
+            queue.start(job["id"], _ingest_job, saved_path, mode, filename)
+            return redirect(url_for("cities.job_status", job_id=job["id"]))
+
         try:
-            city = load_csv(file.stream)
+            # Parse the request stream in chunks; like the background job, keep no copy of the upload
+            city_ids, stats = ingest_csv(file.stream, mode=mode, filename=filename)
         except Exception as e:
             current_app.logger.exception("CSV parsing failed")
             flash(f"Error processing CSV: {e}", "danger")
             return redirect(request.url)
-        flash(f"City '{city.name}' processed and dashboard created.", "success")
-        return redirect(url_for("dashboard.view_city", city_id=city.id))
+        return redirect(_flash_ingest_result(city_ids, stats))
     return render_template("upload.html")
+
+@cities_bp.route("/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    """Progress page for a background upload; polls job_progress"""
+    job = get_queue().store.get(job_id)
+    if job is None:
+        abort(404)
+    return render_template("job_status.html", job=job)
+
+@cities_bp.route("/jobs/<job_id>/progress")
+@login_required
+def job_progress(job_id):
+    """JSON progress of a background job (rows processed, phase, errors)"""
+    job = get_queue().store.get(job_id)
+    if job is None:
+        abort(404)
+    payload = {k: job[k] for k in ("id", "status", "phase", "rows_processed", "errors", "filename") if k in job}
+    if job["status"] in ("done", "failed"):
+        payload["redirect_url"] = url_for("cities.job_done", job_id=job_id)
+    return jsonify(payload)
+
+@cities_bp.route("/jobs/<job_id>/done")
+@login_required
+def job_done(job_id):
+    """Flash the outcome of a finished job and redirect to its dashboard"""
+    job = get_queue().store.get(job_id)
+    if job is None:
+        abort(404)
+    if job["status"] == "failed" and job.get("kind") == "reports":
+        flash(f"Report batch failed: {'; '.join(job['errors'])}", "danger")
+        return redirect(url_for("cities.list_cities"))
+    if job["status"] == "failed":
+        flash(f"Error processing CSV: {'; '.join(job['errors'])}", "danger")
+        return redirect(url_for("cities.upload"))
+    if job["status"] != "done":
+        return redirect(url_for("cities.job_status", job_id=job_id))
+    if job.get("kind") == "reports":
+        return redirect(url_for("dashboard.download_report_batch", job_id=job_id))
+    return redirect(_flash_ingest_result(job["result"]["city_ids"], job["result"]["stats"]))
@@ -1,63 +1,43 @@
-from flask import Blueprint, render_template, abort, request, jsonify, flash, redirect, url_for, current_app
+import json
+import os
+from flask import (
+    Blueprint, Response, render_template, abort, request, jsonify, flash, redirect, url_for, current_app,
+    send_file, stream_with_context,
+)
 from flask_login import login_required
-from models import db, City, Indicator
-from services.csv_loader import get_city_series
-from services.report_generator import ReportGenerator
+from models import db, City, CitySummary
+from services.city_summary import RISK_LEVELS
+from services.kepler import build_kepler_payload, indicator_fields
+from services.jobs import get_queue
+from services.report_batch import generate_reports, write_reports_zip
+from services.report_generator import get_generator
+from services.series_store import city_series
 
 dashboard_bp = Blueprint("dashboard", __name__, url_prefix="/dashboard")
 
+@dashboard_bp.route("/map")
+@login_required
+def national_map():
+    """Every monitored city on one map; viewports are fetched (and clustered) from the map API"""
+    return render_template("national_map.html", map_url=url_for("api.national_map"),
+                           risk_levels=RISK_LEVELS)
+
 @dashboard_bp.route("/<int:city_id>")
 @login_required
 def view_city(city_id):
     city = City.query.get_or_404(city_id)
-    labels, values, forecast = get_city_series(city_id)
-    ind = Indicator.query.filter_by(city_id=city_id).order_by(Indicator.id.desc()).first()
+    ind = city.latest_indicator
     if not ind:
         abort(404)
-    
-    # Get observations for Kepler.gl data
-    from models import Observation
-    observations = Observation.query.filter_by(city_id=city_id).order_by(Observation.id.asc()).all()
-    
-    # Prepare data for Kepler.gl
-    kepler_data = []
-    for obs in observations:
-        kepler_data.append({
-            'week': obs.week_label,
-            'cases': obs.cases,
-            'city_name': city.name,
-            'state': city.state,
-            'country': city.country,
-            'latitude': get_city_coordinates(city.name)[0],
-            'longitude': get_city_coordinates(city.name)[1],
-            'rt': ind.rt,
-            'r0': ind.r0,
-            'hospitalization_rate': ind.hospitalization_rate
-        })
-    
+
+    # Series, forecast and R(t) are fetched from the versioned JSON API
     return render_template(
         "dashboard.html",
         city=city,
-        labels=labels,
-        values=values,
-        forecast=forecast,
         ind=ind,
-        kepler_data=kepler_data,
+        series_url=url_for("api.city_series", city_id=city_id),
     )
 
-def get_city_coordinates(city_name):
-    """Get coordinates for common cities"""
-    city_coordinates = {
-        'Recife': [-8.0476, -34.8770],
-        'São Paulo': [-23.5505, -46.6333],
-        'Rio de Janeiro': [-22.9068, -43.1729],
-        'New York': [40.7128, -74.0060],
-        'London': [51.5074, -0.1278],
-        'Tokyo': [35.6762, 139.6503],
-        'Freetown': [8.4844, -13.2284]
-    }
-    return city_coordinates.get(city_name, [0, 0])
-
 @dashboard_bp.route("/<int:city_id>/generate-report", methods=["POST"])
 @login_required
 def generate_report(city_id):
@@ -68,8 +48,9 @@ def generate_report(city_id):
             flash("OpenAI API key not configured. Please contact your administrator.", "danger")
             return redirect(url_for("dashboard.view_city", city_id=city_id))
         
-        generator = ReportGenerator()
-        report, error = generator.generate_dispatch_report(city_id)
+        generator = get_generator()
+        regenerate = request.form.get("regenerate") == "1"
+        report, error = generator.generate_dispatch_report(city_id, regenerate=regenerate)
         
         if error:
             flash(f"Error generating report: {error}", "danger")
@@ -93,48 +74,80 @@ def generate_report(city_id):
         flash(f"Error generating report: {str(e)}", "danger")
         return redirect(url_for("dashboard.view_city", city_id=city_id))
 
-@dashboard_bp.route("/<int:city_id>/kepler")
+@dashboard_bp.route("/<int:city_id>/dispatch-report")
 @login_required
-def view_kepler(city_id):
-    """View Kepler.gl visualization page"""
+def stream_report_view(city_id):
+    """Report page that fills in from the SSE stream as tokens arrive"""
+    if not current_app.config.get('OPENAI_API_KEY'):
+        flash("OpenAI API key not configured. Please contact your administrator.", "danger")
+        return redirect(url_for("dashboard.view_city", city_id=city_id))
+
     city = City.query.get_or_404(city_id)
-    ind = Indicator.query.filter_by(city_id=city_id).order_by(Indicator.id.desc()).first()
-    if not ind:
-        abort(404)
-    
-    # Get observations for Kepler.gl data
-    from models import Observation
-    observations = Observation.query.filter_by(city_id=city_id).order_by(Observation.id.asc()).all()
-    
-    # Prepare data for Kepler.gl
-    kepler_data = []
-    for obs in observations:
-        kepler_data.append({
-            'week': obs.week_label,
-            'cases': obs.cases,
-            'city_name': city.name,
-            'state': city.state,
-            'country': city.country,
-            'latitude': get_city_coordinates(city.name)[0],
-            'longitude': get_city_coordinates(city.name)[1],
-            'rt': ind.rt,
-            'r0': ind.r0,
-            'hospitalization_rate': ind.hospitalization_rate
-        })
-    
+    return render_template(
+        "dispatch_report.html",
+        city_id=city_id,
+        city=city,
+        report=None,
+        stream_url=url_for("dashboard.stream_report", city_id=city_id,
+                           regenerate=request.args.get("regenerate") or None),
+    )
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@dashboard_bp.route("/<int:city_id>/report-stream")
+@login_required
+def stream_report(city_id):
+    """Server-Sent Events: ``chunk`` events with text, then ``done`` (or ``error``)"""
+    def events():
+        try:
+            chunks, error = get_generator().stream_dispatch_report(
+                city_id, regenerate=request.args.get("regenerate") == "1")
+            if error:
+                yield _sse("error", {"message": error})
+                return
+            for text in chunks:
+                yield _sse("chunk", {"text": text})
+            yield _sse("done", {})
+        except Exception as e:
+            yield _sse("error", {"message": f"Error generating report: {str(e)}"})
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        # Disable proxy buffering so each token reaches the browser immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _kepler_page(city, ind, narrative=None, error_message=None):
+    """The Kepler.gl page carries the city fields only; the browser fetches the weekly data from the API"""
+    summary = db.session.get(CitySummary, city.id)
+    weeks = summary.weeks if summary is not None else len(city_series(city.id).cases)
     return render_template(
         "kepler_view.html",
         city=city,
         ind=ind,
-        kepler_data=kepler_data,
-        processed_data=None,
-        error_message=None
+        indicator=indicator_fields(ind),
+        weeks=weeks,
+        kepler_url=url_for("api.city_kepler", city_id=city.id),
+        narrative=narrative,
+        error_message=error_message
     )
 
+@dashboard_bp.route("/<int:city_id>/kepler")
+@login_required
+def view_kepler(city_id):
+    """View Kepler.gl visualization page (data comes from the Kepler API endpoint)"""
+    city = City.query.get_or_404(city_id)
+    ind = city.latest_indicator
+    if not ind:
+        abort(404)
+    return _kepler_page(city, ind)
+
 @dashboard_bp.route("/<int:city_id>/process-kepler-data", methods=["POST"])
 @login_required
 def process_kepler_data(city_id):
-    """Process data with OpenAI for Kepler.gl visualization"""
+    """Add an OpenAI-written narrative to the Kepler.gl view"""
     try:
         # Check if OpenAI API key is configured
         if not current_app.config.get('OPENAI_API_KEY'):
@@ -142,52 +155,14 @@ def process_kepler_data(city_id):
             return redirect(url_for("dashboard.view_kepler", city_id=city_id))
         
         city = City.query.get_or_404(city_id)
-        ind = Indicator.query.filter_by(city_id=city_id).order_by(Indicator.id.desc()).first()
+        ind = city.latest_indicator
         if not ind:
             abort(404)
-        
-        # Get observations for Kepler.gl data
-        from models import Observation
-        observations = Observation.query.filter_by(city_id=city_id).order_by(Observation.id.asc()).all()
-        
-        # Prepare raw data for OpenAI processing
-        raw_data = []
-        for obs in observations:
-            raw_data.append({
-                'week': obs.week_label,
-                'cases': obs.cases,
-                'city_name': city.name,
-                'state': city.state,
-                'country': city.country,
-                'latitude': get_city_coordinates(city.name)[0],
-                'longitude': get_city_coordinates(city.name)[1],
-                'rt': ind.rt,
-                'r0': ind.r0,
-                'hospitalization_rate': ind.hospitalization_rate
-            })
-        
-        # Process with OpenAI to enhance data for Kepler.gl
-        generator = ReportGenerator()
-        processed_data, error = generator.process_kepler_data(raw_data, city, ind)
-        
-        if error:
-            return render_template(
-                "kepler_view.html",
-                city=city,
-                ind=ind,
-                kepler_data=raw_data,
-                processed_data=None,
-                error_message=error
-            )
-        
-        return render_template(
-            "kepler_view.html",
-            city=city,
-            ind=ind,
-            kepler_data=raw_data,
-            processed_data=processed_data,
-            error_message=None
-        )
+
+        # The prompt summarizes the payload; the page itself still loads it from the API
+        narrative, error = get_generator().kepler_narrative(
+            build_kepler_payload(city, ind), regenerate=request.form.get("regenerate") == "1")
+        return _kepler_page(city, ind, narrative, error)
         
     except Exception as e:
         flash(f"Error processing data: {str(e)}", "danger")
@@ -203,8 +178,9 @@ def download_report(city_id):
             flash("OpenAI API key not configured. Please contact your administrator.", "danger")
             return redirect(url_for("dashboard.view_city", city_id=city_id))
         
-        generator = ReportGenerator()
-        report, error = generator.generate_dispatch_report(city_id)
+        generator = get_generator()
+        regenerate = request.args.get("regenerate") == "1"
+        report, error = generator.generate_dispatch_report(city_id, regenerate=regenerate)
         
         if error:
             flash(f"Error generating report: {error}", "danger")
@@ -213,7 +189,6 @@ def download_report(city_id):
         city = City.query.get_or_404(city_id)
         filename = f"dispatch_report_{city.name}_{city.state}_{city.country}.txt"
         
-        from flask import Response
         return Response(
             report,
             mimetype="text/plain",
@@ -226,3 +201,52 @@ def download_report(city_id):
     except Exception as e:
         flash(f"Error downloading report: {str(e)}", "danger")
         return redirect(url_for("dashboard.view_city", city_id=city_id))
+
+def _report_batch_job(job_id, city_ids, regenerate):
+    """Background job body: batch reports, progress counted in cities.
+
+    The reports are zipped next to the job document as soon as the batch
+    ends, so the download does not depend on the report cache keeping them.
+    """
+    queue = get_queue()
+    result = generate_reports(city_ids, regenerate=regenerate,
+                              progress=lambda done, total: queue.progress(job_id, "generating", done))
+    queue.progress(job_id, "zipping")
+    with open(queue.store.artifact_path(job_id, ".zip"), "wb") as fh:
+        write_reports_zip(result["reports"], fh)
+    # Job results are stored as JSON, whose object keys must be strings
+    return {**result, "reports": sorted(result["reports"]),
+            "errors": {str(k): v for k, v in result["errors"].items()}}
+
+@dashboard_bp.route("/reports/batch", methods=["POST"])
+@login_required
+def start_report_batch():
+    """Start a batch report job (all cities, or ``city_id`` values); returns its job id and URLs"""
+    if not current_app.config.get('OPENAI_API_KEY'):
+        return jsonify({"error": "OpenAI API key not configured"}), 400
+    payload = request.get_json(silent=True) or {}
+    city_ids = payload.get("city_ids") or request.form.getlist("city_id", type=int) or None
+    regenerate = bool(payload.get("regenerate")) or request.form.get("regenerate") == "1"
+    queue = get_queue()
+    job = queue.create("reports")
+    queue.start(job["id"], _report_batch_job, city_ids, regenerate)
+    return jsonify({
+        "job_id": job["id"],
+        "progress_url": url_for("cities.job_progress", job_id=job["id"]),
+        "download_url": url_for("dashboard.download_report_batch", job_id=job["id"]),
+    }), 202
+
+@dashboard_bp.route("/reports/batch/<job_id>/download")
+@login_required
+def download_report_batch(job_id):
+    """Zip of the reports produced by a finished batch job"""
+    job = get_queue().store.get(job_id)
+    if job is None or job.get("kind") != "reports":
+        abort(404)
+    if job["status"] != "done":
+        return jsonify({"status": job["status"], "errors": job["errors"]}), 409
+    path = get_queue().store.artifact_path(job_id, ".zip")
+    if not os.path.exists(path):
+        abort(404)
+    return send_file(path, mimetype="application/zip", as_attachment=True,
+                     download_name=f"dispatch_reports_{job_id}.zip")
@@ -15,9 +15,13 @@ from flask_login import LoginManager, login_required, current_user
 from werkzeug.security import generate_password_hash
 from config import Config
 from models import db, User, City
+from controllers.api import api_bp
 from controllers.auth import auth_bp
 from controllers.cities import cities_bp
 from controllers.dashboard import dashboard_bp
+from services import jobs, metrics, report_generator
+from services.migrations import upgrade_db
+from commands import register_commands
 
 def create_app():
     app = Flask(__name__)
@@ -25,6 +29,9 @@ def create_app():
 
     # Init extensions
     db.init_app(app)
+    jobs.init_app(app)
+    report_generator.init_app(app)
+    metrics.init_app(app)
 
     login_manager = LoginManager()
     login_manager.login_view = "auth.login"
@@ -38,6 +45,7 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(cities_bp)
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(api_bp)
 
     # Routes
     @app.route("/")
@@ -61,12 +69,14 @@ def create_app():
             os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
             print("Database initialized.")
 
+    register_commands(app)
+
     return app
 
 if __name__ == "__main__":
     app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade_db()
         # Seed admin if missing
         if not User.query.filter_by(username="admin").first():
             admin = User(username="admin", password_hash=generate_password_hash("admin"))
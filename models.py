@@ -11,23 +11,118 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class City(db.Model):
+    __table_args__ = (
+        # Keyset pagination of the city list
+        db.Index("ix_city_created_at_id", "created_at", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), nullable=False)
     state = db.Column(db.String(120), nullable=True)
     country = db.Column(db.String(120), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    latitude = db.Column(db.Float, nullable=True)  # resolved from the gazetteer at ingest
+    longitude = db.Column(db.Float, nullable=True)
+    latest_indicator_id = db.Column(db.Integer, nullable=True)  # maintained at ingest
+    data_version = db.Column(db.Integer, nullable=False, default=0)  # bumped whenever observations change
     observations = db.relationship("Observation", backref="city", lazy=True, cascade="all, delete-orphan")
+    latest_indicator = db.relationship(
+        "Indicator",
+        primaryjoin="foreign(City.latest_indicator_id) == Indicator.id",
+        viewonly=True,
+        uselist=False,
+    )
 
 class Observation(db.Model):
+    __table_args__ = (
+        # Series reads in chronological order, and the append-mode upsert key
+        db.Index("ix_observation_city_week_idx", "city_id", "week_idx"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     city_id = db.Column(db.Integer, db.ForeignKey("city.id"), nullable=False)
     week_label = db.Column(db.String(32), nullable=False)  # e.g., 'Wk 40'
+    week_idx = db.Column(db.Integer, nullable=True)  # sortable chronological key, see services.weeks
     cases = db.Column(db.Integer, nullable=False, default=0)
 
+class CitySeries(db.Model):
+    """Packed copy of a city's observations for fast reads, rebuilt from Observation (see services.series_store)"""
+    city_id = db.Column(db.Integer, db.ForeignKey("city.id"), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)  # City.data_version the arrays were packed at
+    length = db.Column(db.Integer, nullable=False, default=0)
+    labels = db.Column(db.Text, nullable=False, default="")  # week labels joined by \x1f
+    week_idx = db.Column(db.LargeBinary, nullable=False)  # little-endian int64 array
+    cases = db.Column(db.LargeBinary, nullable=False)  # little-endian int64 array
+
+class CitySummary(db.Model):
+    """Latest state of a city for listing and ranking, maintained at ingest (see services.city_summary)"""
+    __table_args__ = (
+        # Rankings; SQLite appends the city_id rowid, so each also serves the keyset tie-break
+        db.Index("ix_city_summary_rt", "rt"),
+        db.Index("ix_city_summary_growth", "growth"),
+        db.Index("ix_city_summary_last_cases", "last_cases"),
+        db.Index("ix_city_summary_risk_rt", "risk_level", "rt"),
+        db.Index("ix_city_summary_country_rt", "country", "rt"),
+        # Map viewports: geohash-prefix range scans over the cells covering the box
+        db.Index("ix_city_summary_geohash", "geohash"),
+    )
+    city_id = db.Column(db.Integer, db.ForeignKey("city.id"), primary_key=True)
+    data_version = db.Column(db.Integer, nullable=False)  # City.data_version summarized
+    country = db.Column(db.String(120), nullable=True)
+    weeks = db.Column(db.Integer, nullable=False, default=0)  # observations on record
+    last_week_label = db.Column(db.String(32), nullable=True)
+    last_week_idx = db.Column(db.Integer, nullable=True)
+    last_cases = db.Column(db.Integer, nullable=True)
+    growth = db.Column(db.Float, nullable=True)  # week-over-week, 0.25 = +25%
+    rt = db.Column(db.Float, nullable=True)  # from the latest indicator
+    hospitalization_rate = db.Column(db.Float, nullable=True)
+    risk_level = db.Column(db.String(8), nullable=True)
+    latitude = db.Column(db.Float, nullable=True)
+    longitude = db.Column(db.Float, nullable=True)
+    geohash = db.Column(db.String(12), nullable=True)  # grid cell of the coordinates, see services.spatial
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class Indicator(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     city_id = db.Column(db.Integer, db.ForeignKey("city.id"), nullable=False)
     rt = db.Column(db.Float, nullable=True)  # transmission rate
     r0 = db.Column(db.Float, nullable=True)  # basic reproduction number
     hospitalization_rate = db.Column(db.Float, nullable=True)  # percentage
+    risk_level = db.Column(db.String(8), nullable=True)  # HIGH / MEDIUM / LOW, see services.enrichment
+    severity_score = db.Column(db.Float, nullable=True)  # 0-1
     computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# Latest indicator per city
+db.Index("ix_indicator_city_id_desc", Indicator.city_id, Indicator.id.desc())
+
+class UploadedFile(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)  # content hash of the raw upload
+    filename = db.Column(db.String(255), nullable=True)
+    mode = db.Column(db.String(16), nullable=False, default="replace")  # 'replace' or 'append'
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    versions = db.Column(db.String(64), nullable=True)  # data versions of its cities after the ingest
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class Place(db.Model):
+    """Gazetteer entry; looked up by normalized (accent/case-folded) keys, see services.gazetteer"""
+    __table_args__ = (
+        db.Index("ix_place_name_key", "name_key", "country_key", "state_key"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=True)
+    country = db.Column(db.String(120), nullable=True)
+    name_key = db.Column(db.String(120), nullable=False)
+    state_key = db.Column(db.String(120), nullable=False, default="")
+    country_key = db.Column(db.String(120), nullable=False, default="")
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+class CachedReport(db.Model):
+    """Generated dispatch report keyed by a hash of its prompt inputs, see services.report_store"""
+    id = db.Column(db.Integer, primary_key=True)
+    fingerprint = db.Column(db.String(64), unique=True, nullable=False)
+    city_id = db.Column(db.Integer, db.ForeignKey("city.id"), nullable=False, index=True)
+    model = db.Column(db.String(64), nullable=True)
+    report = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)  # LRU eviction order
@@ -1,22 +1,68 @@
-def compute_indicators(series):
-    if not series or len(series) < 2:
-        # Defaults if we can't compute
-        return 0.95, 1.3, 5.8
-    last, prev = series[-1], series[-2]
-    rt = round((last / prev) if prev else 1.0, 2)
-    # Keep a default R0; in real app you would estimate this
-    r0 = 1.3
+import numpy as np
+from services.forecasting import forecast_series
+from services.rt_estimator import estimate_rt_matrix, history_length, rt_settings
+
+# rt, r0, hospitalization_rate used when a series is too short to estimate
+DEFAULT_INDICATORS = (0.95, 1.3, 5.8)
+
+def series_matrix(series_list, width=None):
+    """Right-aligned, zero-left-padded (cities x width) matrix of each series' last ``width`` points.
+
+    ``width`` defaults to the longest series. Returns the matrix and the
+    number of real points in every row.
+    """
+    lengths = np.array([0 if series is None else len(series) for series in series_list], dtype="int64")
+    if width is None:
+        width = max(2, int(lengths.max()) if len(lengths) else 0)
+    lengths = np.minimum(lengths, width)
+    matrix = np.zeros((len(series_list), width), dtype="float64")
+    for row, (series, length) in enumerate(zip(series_list, lengths)):
+        if length:
+            matrix[row, width - length:] = np.asarray(series)[-length:]
+    return matrix, lengths
+
+def compute_indicators_batch(matrix, lengths, settings=None):
+    """Indicators for every row of a ``series_matrix`` in one vectorized pass.
+
+    R(t) is the latest renewal-equation estimate (services.rt_estimator)
+    and R0 the earliest one, i.e. transmission during initial growth.
+    Returns a dict of unrounded arrays: rt, r0, growth and
+    hospitalization_rate (see round_indicators for the stored precision).
+    """
+    rows = np.arange(len(matrix))
+    estimate = estimate_rt_matrix(matrix, lengths, **(settings or rt_settings()))["mean"]
+    defined = ~np.isnan(estimate)
+    rt = np.where(defined[:, -1], estimate[:, -1], DEFAULT_INDICATORS[0])
+    r0 = np.where(defined.any(axis=1), estimate[rows, defined.argmax(axis=1)], DEFAULT_INDICATORS[1])
+
+    last, prev = matrix[:, -1], matrix[:, -2]
+    growth = np.divide(last - prev, prev, out=np.zeros_like(last), where=prev != 0)
     # Hospitalization proxy: 3% + intensity factor
-    change = (last - prev) / prev if prev else 0
-    hosp = round(3.0 + max(0, change * 10), 1)
-    return rt, r0, hosp
-
-def compute_forecast(series):
-    # Very simple illustrative forecast: decay by 10% per step from last value
-    if not series:
-        return [0, 0, 0]
-    last = series[-1]
-    f1 = round(last * 0.9)
-    f2 = round(f1 * 0.9)
-    f3 = round(f2 * 0.9)
-    return [f1, f2, f3]
+    hosp = 3.0 + np.maximum(0, growth * 10)
+
+    short = np.asarray(lengths) < 2
+    rt[short], r0[short], hosp[short] = DEFAULT_INDICATORS
+    growth[short] = 0.0
+    return {"rt": rt, "r0": r0, "growth": growth, "hospitalization_rate": hosp}
+
+def indicator_span(cases, settings=None):
+    """``(head_end, tail_start)``: indicators only read ``cases[:head_end]`` (R0) and ``cases[tail_start:]`` (R(t)).
+
+    Edits to weeks between the two cannot change a city's indicators.
+    """
+    history = history_length(settings)
+    first_case = next((i for i, c in enumerate(cases) if c), len(cases))
+    return first_case + history + 1, max(0, len(cases) - history)
+
+def round_indicators(rt, r0, hosp):
+    """Stored precision; Python's round (not np.round) so halves round the same as before"""
+    return round(float(rt), 2), round(float(r0), 2), round(float(hosp), 1)
+
+def compute_indicators(series, settings=None):
+    matrix, lengths = series_matrix([series])
+    ind = compute_indicators_batch(matrix, lengths, settings)
+    return round_indicators(ind["rt"][0], ind["r0"][0], ind["hospitalization_rate"][0])
+
+def compute_forecast(series, model=None, horizon=None):
+    """Point forecast (whole cases) for the next ``horizon`` weeks; see services.forecasting"""
+    return forecast_series(series, model=model, horizon=horizon)["point"]
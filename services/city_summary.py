@@ -0,0 +1,130 @@
+from datetime import datetime
+from sqlalchemy import delete, func, insert, select, tuple_
+from services.enrichment import RISK_LEVELS, risk_levels
+from services.series_store import load_series
+from services.db_utils import LOOKUP_BATCH_SIZE, batches
+from services.spatial import geohash
+from models import db, City, CitySummary, Indicator
+
+# ?sort= values of the city list / API, highest first
+SORT_KEYS = {
+    "recent": City.created_at,
+    "rt": CitySummary.rt,
+    "growth": CitySummary.growth,
+    "cases": CitySummary.last_cases,
+}
+
+def _summary_row(city, packed, now):
+    cases = packed.cases
+    growth = None
+    if len(cases) >= 2 and cases[-2]:
+        growth = round(float(cases[-1] - cases[-2]) / float(cases[-2]), 4)
+    risk = city.risk_level
+    if risk is None and city.rt is not None:
+        # Indicator stored before enrichment was persisted (see upgrade-db)
+        risk = str(risk_levels(city.rt))
+    return {
+        "city_id": city.id,
+        "data_version": city.data_version,
+        "country": city.country,
+        "weeks": len(cases),
+        "last_week_label": packed.labels[-1] if len(cases) else None,
+        "last_week_idx": int(packed.week_idx[-1]) if len(cases) else None,
+        "last_cases": int(cases[-1]) if len(cases) else None,
+        "growth": growth,
+        "rt": city.rt,
+        "hospitalization_rate": city.hospitalization_rate,
+        "risk_level": risk,
+        "latitude": city.latitude,
+        "longitude": city.longitude,
+        "geohash": geohash(city.latitude, city.longitude) if city.latitude is not None else None,
+        "updated_at": now,
+    }
+
+def refresh_summaries(city_ids=None) -> int:
+    """Rewrite the CitySummary rows of ``city_ids`` (every city when None); returns rows written.
+
+    Reads the packed series and the latest indicator, so call it after both
+    are current (ingest does, inside its transaction).
+    """
+    if city_ids is None:
+        city_ids = [row.id for row in db.session.execute(select(City.id))]
+    now = datetime.utcnow()
+    written = 0
+    for batch in batches(list(city_ids), LOOKUP_BATCH_SIZE):
+        cities = db.session.execute(
+            select(City.id, City.data_version, City.country, City.latitude, City.longitude,
+                   Indicator.rt, Indicator.hospitalization_rate, Indicator.risk_level)
+            .outerjoin(Indicator, Indicator.id == City.latest_indicator_id)
+            .where(City.id.in_(batch))
+        ).all()
+        series = load_series(batch, commit=False)
+        db.session.execute(delete(CitySummary).where(CitySummary.city_id.in_(batch))
+                           .execution_options(synchronize_session=False))
+        rows = [_summary_row(city, series[city.id], now) for city in cities]
+        if rows:
+            db.session.execute(insert(CitySummary.__table__), rows)
+        written += len(rows)
+    return written
+
+def summary_page(sort="recent", risk=None, country=None, after=None, limit=24):
+    """One page of (City, CitySummary) rows ordered by ``sort`` (highest first) in a single indexed query.
+
+    Keyset pagination: ``after`` is the last city id of the previous page.
+    Rankings skip cities that have no value for the sort key. Returns the
+    rows and the ``after`` of the next page (None on the last page).
+    """
+    key = SORT_KEYS[sort]
+    # Tie-break on the column the sort key's index carries
+    tie = City.id if sort == "recent" else CitySummary.city_id
+    query = db.session.query(City, CitySummary)
+    if sort == "recent" and not (risk or country):
+        query = query.outerjoin(CitySummary, CitySummary.city_id == City.id)
+    else:
+        query = query.join(CitySummary, CitySummary.city_id == City.id)
+    if sort != "recent":
+        query = query.filter(key.isnot(None))
+    if risk:
+        query = query.filter(CitySummary.risk_level == risk)
+    if country:
+        query = query.filter(CitySummary.country == country)
+    if after:
+        anchor = db.session.execute(
+            select(key).select_from(City).outerjoin(CitySummary, CitySummary.city_id == City.id)
+            .where(City.id == after)
+        ).first()
+        if anchor is not None and anchor[0] is not None:
+            query = query.filter(tuple_(key, tie) < tuple_(anchor[0], after))
+    rows = query.order_by(key.desc(), tie.desc()).limit(limit + 1).all()
+    next_after = rows[limit - 1][0].id if len(rows) > limit else None
+    return rows[:limit], next_after
+
+def summary_dict(city, summary):
+    """JSON-ready view of one city's summary (``summary`` may be None)"""
+    columns = ["data_version", "weeks", "last_week_label", "last_cases", "growth", "rt",
+               "hospitalization_rate", "risk_level", "latitude", "longitude"]
+    result = {"id": city.id, "name": city.name, "state": city.state, "country": city.country}
+    result.update({column: getattr(summary, column) if summary else None for column in columns})
+    return result
+
+def national_overview(country=None):
+    """Aggregate counts and cases per risk level, from the summary table alone"""
+    query = select(
+        CitySummary.risk_level,
+        func.count(CitySummary.city_id),
+        func.coalesce(func.sum(CitySummary.last_cases), 0),
+        func.avg(CitySummary.rt),
+    ).group_by(CitySummary.risk_level)
+    if country:
+        query = query.where(CitySummary.country == country)
+    by_risk = {}
+    cities = cases = 0
+    for risk, count, last_cases, mean_rt in db.session.execute(query):
+        cities += count
+        cases += last_cases
+        by_risk[risk or "UNKNOWN"] = {
+            "cities": count,
+            "last_cases": int(last_cases),
+            "mean_rt": round(mean_rt, 2) if mean_rt is not None else None,
+        }
+    return {"country": country, "cities": cities, "last_cases": int(cases), "by_risk": by_risk}
@@ -1,50 +1,490 @@
+import csv
+import hashlib
+import io
+import os
+import time
+import numpy as np
 import pandas as pd
-from services.analytics import compute_indicators, compute_forecast
-from models import db, City, Observation, Indicator
+from flask import current_app
+from sqlalchemy import bindparam, delete, func, insert, select, tuple_, update
+from services.analytics import (
+    compute_indicators_batch, indicator_span, round_indicators, series_matrix,
+)
+from services.enrichment import risk_levels, severity_scores
+from services.forecasting import city_forecast, forecast_cities
+from services.rt_estimator import rt_settings
+from services.db_utils import INSERT_BATCH_SIZE, LOOKUP_BATCH_SIZE, batches
+from services.weeks import append_week_index, week_index
+from services.gazetteer import geocode_cities
+from services.metrics import PhaseTimer
+from services.city_summary import refresh_summaries
+from services.series_store import city_series, load_series, rebuild_series
+from models import db, City, Observation, Indicator, UploadedFile
 
 REQUIRED_COLUMNS = {"city","state","country","week_label","cases"}
+CITY_KEY = ["city", "state", "country"]
+# 'replace' wipes each city's history; 'append' upserts on (city_id, week_idx)
+INGEST_MODES = ("replace", "append")
 
-def allowed(df: pd.DataFrame) -> bool:
-    return REQUIRED_COLUMNS.issubset(set(c.lower() for c in df.columns))
+# Default number of CSV rows parsed and written per chunk
+DEFAULT_CHUNK_ROWS = 50000
+# Bytes pulled from the upload stream per read
+READ_BUFFER_SIZE = 1 << 20
 
-def load_csv(file_storage) -> City:
-    df = pd.read_csv(file_storage)
-    # Normalize columns to lowercase
-    df.columns = [c.lower().strip() for c in df.columns]
-    if not allowed(df):
+def _coerce_observations(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalize week labels and case counts column-wise (no per-row Python work)"""
+    return pd.DataFrame({
+        "week_label": df["week_label"].astype(str).str.strip(),
+        "cases": pd.to_numeric(df["cases"], errors="raise").astype("int64"),
+    })
+
+def _insert_batched(table, rows, batch_size=INSERT_BATCH_SIZE):
+    """Insert a list of row dicts with one executemany per batch"""
+    for batch in batches(rows, batch_size):
+        db.session.execute(insert(table), batch)
+
+def _lookup_cities(keys):
+    """Map (name, state, country) keys to existing City ids with set-based lookups"""
+    found = {}
+    for batch in batches(keys, LOOKUP_BATCH_SIZE):
+        rows = db.session.execute(
+            select(City.id, City.name, City.state, City.country)
+            .where(tuple_(City.name, City.state, City.country).in_(batch))
+            .order_by(City.id)
+        )
+        for row in rows:
+            found.setdefault((row.name, row.state, row.country), row.id)
+    return found
+
+def _resolve_cities(keys):
+    """Find or create every City in ``keys``; returns a key -> city id dict"""
+    found = _lookup_cities(keys)
+    missing = [k for k in keys if k not in found]
+    if missing:
+        _insert_batched(City.__table__, [
+            {"name": name, "state": state, "country": country}
+            for name, state, country in missing
+        ])
+        found.update(_lookup_cities(missing))
+    return found
+
+class _TeeReader(io.RawIOBase):
+    """Binary reader that hashes every byte it hands out and copies it to ``sink``"""
+
+    def __init__(self, source, sink=None):
+        self._source = source
+        self._sink = sink
+        self._digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._source.read(len(buffer))
+        if not data:
+            return 0
+        size = len(data)
+        buffer[:size] = data
+        self._digest.update(data)
+        if self._sink is not None:
+            self._sink.write(data)
+        return size
+
+    def drain(self):
+        """Consume the rest of the source so the sink (and digest) hold the full upload"""
+        while self.read(READ_BUFFER_SIZE):
+            pass
+
+    def hexdigest(self) -> str:
+        """SHA-256 of the bytes read so far (the whole upload after ``drain``)"""
+        return self._digest.hexdigest()
+
+def _read_header(text) -> list:
+    """Parse and validate the header line without touching the data rows"""
+    line = text.readline()
+    columns = [c.lower().strip() for c in next(csv.reader([line]), [])]
+    if not REQUIRED_COLUMNS.issubset(columns):
         raise ValueError(f"CSV must contain the following columns: {sorted(REQUIRED_COLUMNS)}")
-    # Take first row to create/find the City
-    first = df.iloc[0]
-    name, state, country = str(first["city"]).strip(), str(first["state"]).strip(), str(first["country"]).strip()
-
-    city = City.query.filter_by(name=name, state=state, country=country).first()
-    if city is None:
-        city = City(name=name, state=state, country=country)
-        db.session.add(city)
-        db.session.flush()  # to get city.id
-
-    # Wipe previous observations for idempotent re-upload
-    # (could be changed to append/versioning later)
-    for obs in list(city.observations):
-        db.session.delete(obs)
-
-    observations = []
-    for _, row in df.iterrows():
-        week_label = str(row["week_label"]).strip()
-        cases = int(row["cases"])
-        observations.append(Observation(city_id=city.id, week_label=week_label, cases=cases))
-    db.session.add_all(observations)
-
-    # Compute and store indicators
-    rt, r0, hosp = compute_indicators([o.cases for o in observations])
-    db.session.add(Indicator(city_id=city.id, rt=rt, r0=r0, hospitalization_rate=hosp))
-
-    db.session.commit()
-    return city
+    return columns
+
+def _iter_chunks(text, columns, chunk_rows):
+    """Yield DataFrame chunks of at most ``chunk_rows`` rows"""
+    return pd.read_csv(
+        text,
+        header=None,
+        names=columns,
+        usecols=sorted(REQUIRED_COLUMNS),
+        dtype={"city": str, "state": str, "country": str, "week_label": str},
+        chunksize=chunk_rows,
+    )
+
+def _versions_tag(versions) -> str:
+    """Fingerprint of {city id: data_version}; an upload is a duplicate only while it still matches"""
+    blob = ",".join(f"{city_id}:{version}" for city_id, version in sorted(versions.items()))
+    return hashlib.sha256(blob.encode("ascii")).hexdigest()
+
+def _data_versions(city_ids):
+    versions = {}
+    for batch in batches(list(city_ids), LOOKUP_BATCH_SIZE):
+        versions.update(db.session.execute(
+            select(City.id, City.data_version).where(City.id.in_(batch))
+        ).all())
+    return versions
+
+class _IngestState:
+    """Bookkeeping carried across the chunks of one upload"""
+
+    def __init__(self, mode):
+        self.mode = mode
+        self.key_to_id = {}
+        self.city_ids = []
+        # append mode: (city_id, week_idx) -> cases, latest stored week_idx and week_idx written per city
+        self.known = {}
+        self.max_idx = {}
+        self.changed = {}
+        # append mode: stored week_idx per city in order, and label -> latest week_idx
+        self.stored_keys = {}
+        self.stored_labels = {}
+        # week_idx of the last row written per city, carried across chunks
+        self.last_idx = {}
+        # City.data_version of every touched city before this upload
+        self.versions_before = {}
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+
+    def add_cities(self, resolved, new_keys):
+        new_ids = [resolved[k] for k in new_keys]
+        self.versions_before.update(_data_versions(new_ids))
+        table = Observation.__table__
+        if self.mode == "replace":
+            # Wipe previous observations for idempotent re-upload
+            for batch in batches(new_ids, LOOKUP_BATCH_SIZE):
+                db.session.execute(delete(table).where(table.c.city_id.in_(batch)))
+        else:
+            for batch in batches(new_ids, LOOKUP_BATCH_SIZE):
+                # Rows without a week_idx predate the column; upgrade-db backfills them
+                rows = db.session.execute(
+                    select(table.c.city_id, table.c.week_idx, table.c.week_label, table.c.cases)
+                    .where(table.c.city_id.in_(batch))
+                    .where(table.c.week_idx.isnot(None))
+                    .order_by(table.c.city_id, table.c.week_idx)
+                )
+                for r in rows:
+                    self.known[(r.city_id, r.week_idx)] = r.cases
+                    self.max_idx[r.city_id] = r.week_idx
+                    self.stored_keys.setdefault(r.city_id, []).append(r.week_idx)
+                    self.stored_labels.setdefault(r.city_id, {})[r.week_label] = r.week_idx
+        self.key_to_id.update(resolved)
+        self.city_ids.extend(new_ids)
+
+    def assign_week_idx(self, frame: pd.DataFrame):
+        """Add the chronological week key, computed column-wise per city.
+
+        Appended rows are lined up with the weeks already stored (see
+        services.weeks.append_week_index); later chunks continue from the
+        last key written.
+        """
+        week_idx = np.empty(len(frame), dtype="int64")
+        labels = frame["week_label"]
+        for city_id, positions in frame.groupby("city_id", sort=False).indices.items():
+            city_labels = labels.iloc[positions]
+            previous = self.last_idx.get(city_id)
+            if self.mode == "append":
+                idx = append_week_index(city_labels, self.stored_keys.get(city_id, []),
+                                        self.stored_labels.setdefault(city_id, {}), previous)
+            else:
+                idx = week_index(city_labels, previous)
+            week_idx[positions] = idx
+            self.last_idx[city_id] = int(idx[-1])
+        frame["week_idx"] = week_idx
+
+    def write(self, frame: pd.DataFrame):
+        table = Observation.__table__
+        if self.mode == "replace":
+            _insert_batched(table, frame.to_dict("records"))
+            self.inserted += len(frame)
+            return
+
+        # Upsert: later rows for the same week win, unchanged weeks are skipped
+        frame = frame.drop_duplicates(["city_id", "week_idx"], keep="last")
+        keys = list(zip(frame["city_id"].tolist(), frame["week_idx"].tolist()))
+        old = pd.Series([self.known.get(k) for k in keys], index=frame.index, dtype="float64")
+        is_new = old.isna()
+        is_changed = ~is_new & (old != frame["cases"])
+        _insert_batched(table, frame[is_new].to_dict("records"))
+        changed = frame.loc[is_changed, ["city_id", "week_idx", "cases"]].rename(columns={
+            "city_id": "b_city_id", "week_idx": "b_week_idx", "cases": "b_cases",
+        })
+        for batch in batches(changed.to_dict("records"), INSERT_BATCH_SIZE):
+            db.session.execute(
+                update(table)
+                .where(table.c.city_id == bindparam("b_city_id"))
+                .where(table.c.week_idx == bindparam("b_week_idx"))
+                .values(cases=bindparam("b_cases")),
+                batch,
+            )
+        touched = frame[is_new | is_changed]
+        for city_id, week_idx, cases in touched[["city_id", "week_idx", "cases"]].itertuples(index=False):
+            self.known[(city_id, week_idx)] = cases
+            self.max_idx[city_id] = max(week_idx, self.max_idx.get(city_id, week_idx))
+            self.changed.setdefault(city_id, set()).add(week_idx)
+        self.inserted += int(is_new.sum())
+        self.updated += int(is_changed.sum())
+        self.unchanged += len(frame) - len(touched)
+
+    def changed_city_ids(self):
+        """Cities whose observations this upload actually modified"""
+        if self.mode == "replace":
+            return list(self.city_ids)
+        return [city_id for city_id in self.city_ids if self.changed.get(city_id)]
+
+    def indicators_changed(self, city_id, week_idx, cases, settings) -> bool:
+        """Whether this upload touched one of the weeks the indicators depend on"""
+        if self.mode == "replace":
+            return True
+        changed = self.changed.get(city_id)
+        if not changed:
+            return False
+        head_end, tail_start = indicator_span(cases, settings)
+        return any(idx in changed for idx in week_idx[:head_end].tolist() + week_idx[tail_start:].tolist())
+
+def _indicator_rows(city_ids, indicators):
+    """Indicator row dicts from the arrays returned by compute_indicators_batch.
+
+    Risk level and severity are derived from the stored (rounded) values.
+    """
+    rounded = [round_indicators(rt, r0, hosp) for rt, r0, hosp in
+               zip(indicators["rt"], indicators["r0"], indicators["hospitalization_rate"])]
+    if not rounded:
+        return []
+    rts, r0s, hosps = zip(*rounded)
+    risks = risk_levels(rts)
+    severities = severity_scores(rts, r0s, hosps)
+    return [
+        {"city_id": int(city_id), "rt": rt, "r0": r0, "hospitalization_rate": hosp,
+         "risk_level": str(risk), "severity_score": float(severity)}
+        for city_id, (rt, r0, hosp), risk, severity in zip(city_ids, rounded, risks, severities)
+    ]
+
+def _insert_indicators(state: _IngestState):
+    """Compute and store an Indicator for every city whose indicator inputs changed"""
+    settings = rt_settings()
+    city_ids, series = [], []
+    for city_id, packed in load_series(state.city_ids, commit=False).items():
+        if state.indicators_changed(city_id, packed.week_idx, packed.cases, settings):
+            city_ids.append(city_id)
+            series.append(packed.cases)
+    if not city_ids:
+        return 0
+    rows = _indicator_rows(city_ids, compute_indicators_batch(*series_matrix(series), settings))
+    _insert_batched(Indicator.__table__, rows)
+    return len(rows)
+
+def _all_series():
+    """(city ids, series matrix, lengths) for every city with observations, from the packed store"""
+    city_ids = [row.id for row in db.session.execute(select(City.id).order_by(City.id))]
+    series = {city_id: packed.cases for city_id, packed in load_series(city_ids).items() if len(packed.cases)}
+    ids = sorted(series)
+    matrix, lengths = series_matrix([series[i] for i in ids])
+    return ids, matrix, lengths
+
+def recompute_indicators():
+    """Store a fresh Indicator for every city with observations; returns the number of cities.
+
+    Series come from the packed store and are computed in one vectorized pass.
+    """
+    city_ids, matrix, lengths = _all_series()
+    if not city_ids:
+        return 0
+    indicator_rows = _indicator_rows(city_ids, compute_indicators_batch(matrix, lengths))
+    _insert_batched(Indicator.__table__, indicator_rows)
+    refresh_latest_indicators()
+    refresh_summaries(city_ids)
+    return len(indicator_rows)
+
+def forecast_all_cities(model=None, horizon=None, interval=None):
+    """Forecast every city with observations in one vectorized pass; returns {city id: forecast}.
+
+    Results land in the forecast cache, so dashboards in this process skip the refit.
+    """
+    city_ids, matrix, lengths = _all_series()
+    if not city_ids:
+        return {}
+    cities = {c.id: c for c in City.query.filter(City.id.in_(city_ids)).all()}
+    return forecast_cities([cities[i] for i in city_ids], matrix, lengths, model, horizon, interval)
+
+def refresh_latest_indicators(city_ids=None):
+    """Point City.latest_indicator_id at each city's newest Indicator (all cities when ``city_ids`` is None)"""
+    latest = (select(func.max(Indicator.id))
+              .where(Indicator.city_id == City.id)
+              .scalar_subquery())
+    stmt = update(City).values(latest_indicator_id=latest).execution_options(synchronize_session=False)
+    if city_ids is None:
+        db.session.execute(stmt)
+        return
+    for batch in batches(list(city_ids), LOOKUP_BATCH_SIZE):
+        db.session.execute(stmt.where(City.id.in_(batch)))
+
+def bump_data_versions(city_ids):
+    """Invalidate caches keyed on City.data_version for ``city_ids``"""
+    for batch in batches(list(city_ids), LOOKUP_BATCH_SIZE):
+        db.session.execute(
+            update(City).where(City.id.in_(batch))
+            .values(data_version=City.data_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+def _ingest_chunk(df: pd.DataFrame, state: _IngestState):
+    """Write one parsed chunk, resolving cities not seen in earlier chunks"""
+    for col in CITY_KEY:
+        df[col] = df[col].astype(str).str.strip()
+    frame = _coerce_observations(df)
+
+    # Group rows by city and resolve the ones not seen in earlier chunks at once
+    chunk_keys = [tuple(k) for k in df[CITY_KEY].drop_duplicates().itertuples(index=False)]
+    new_keys = [k for k in chunk_keys if k not in state.key_to_id]
+    if new_keys:
+        state.add_cities(_resolve_cities(new_keys), new_keys)
+
+    codes = df.groupby(CITY_KEY, sort=False).ngroup().to_numpy()
+    ids = pd.Series([state.key_to_id[k] for k in chunk_keys], dtype="int64").to_numpy()
+    frame.insert(0, "city_id", ids[codes])
+    state.assign_week_idx(frame)
+    state.write(frame)
+    return len(frame)
+
+def ingest_csv(source, save_path=None, chunk_rows=None, progress=None, mode="replace", filename=None):
+    """Bulk ingest engine: stream, coerce and persist a (multi-city) CSV upload.
+
+    ``source`` is a seekable binary file object or a path. The file is
+    parsed in chunks of ``chunk_rows`` rows which are written as they
+    arrive, so memory stays flat regardless of file size. When
+    ``save_path`` is given the raw bytes are copied there in the same pass.
+
+    Rows are grouped by (city, state, country). In ``replace`` mode every
+    city's observations are replaced; in ``append`` mode the file's weeks
+    are lined up with the city's stored weeks (services.weeks.append_week_index),
+    rows are upserted on (city_id, week_idx) and only changed weeks are
+    written. A new Indicator is stored only when weeks its estimate depends
+    on changed.
+
+    The upload is hashed while it is parsed. When the same bytes were
+    already ingested in the same mode and none of the file's cities has
+    changed since, the work is rolled back and the upload reported as
+    skipped (its saved copy is removed); re-sending an older file to revert
+    a city still goes through.
+
+    ``progress`` is an optional ``callable(phase, rows_processed)`` invoked
+    after every chunk and at each phase change.
+
+    Returns the list of touched city ids (in file order) and a stats dict
+    with rows, cities, seconds and rows_per_sec, plus inserted, updated,
+    unchanged, indicators and skipped.
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"Unknown ingest mode '{mode}'; expected one of {INGEST_MODES}")
+    started = time.perf_counter()
+    phases = PhaseTimer()
+
+    def report(phase, rows):
+        phases.mark(phase)
+        if progress:
+            progress(phase, rows)
+
+    chunk_rows = chunk_rows or current_app.config.get("INGEST_CHUNK_ROWS", DEFAULT_CHUNK_ROWS)
+    owns_source = isinstance(source, (str, bytes)) or hasattr(source, "__fspath__")
+    if owns_source:
+        source = open(source, "rb")
+    sink, duplicate_of = None, None
+    try:
+        sink = open(save_path, "wb") if save_path else None
+        tee = _TeeReader(source, sink)
+        text = io.TextIOWrapper(io.BufferedReader(tee, READ_BUFFER_SIZE), encoding="utf-8-sig", newline="")
+        state, total = _IngestState(mode), 0
+        try:
+            columns = _read_header(text)
+            report("parsing", 0)
+            for df in _iter_chunks(text, columns, chunk_rows):
+                total += _ingest_chunk(df, state)
+                report("parsing", total)
+            if not total:
+                raise ValueError("CSV contains no data rows")
+            tee.drain()
+            digest = tee.hexdigest()
+            previous = UploadedFile.query.filter_by(sha256=digest).first()
+            if (previous is not None and previous.mode == mode
+                    and previous.versions == _versions_tag(state.versions_before)):
+                current_app.logger.info("Skipping upload %s: identical to upload %s", filename, previous.id)
+                duplicate_of = previous.filename or ""
+            else:
+                report("indicators", total)
+                # Coordinates are resolved once here so rendering never geocodes;
+                # geocoding bumps data_version too, so it runs before the re-pack
+                geocode_cities(state.city_ids)
+                # Bump first so the re-packed series carry the new data_version
+                bump_data_versions(state.changed_city_ids())
+                rebuild_series(state.changed_city_ids())
+                indicators = _insert_indicators(state)
+                refresh_latest_indicators(state.city_ids)
+                refresh_summaries(state.city_ids)
+        finally:
+            # Keep a complete copy of the upload even when parsing stops early
+            tee.drain()
+        if duplicate_of is not None:
+            db.session.rollback()
+        else:
+            record = previous or UploadedFile(sha256=digest)
+            record.filename, record.mode, record.rows = filename, mode, total
+            record.versions = _versions_tag(_data_versions(state.city_ids))
+            db.session.add(record)
+            report("committing", total)
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        phases.finish()
+        if sink is not None:
+            sink.close()
+            if duplicate_of is not None:
+                os.remove(save_path)
+        if owns_source:
+            source.close()
+
+    if duplicate_of is not None:
+        return [], {
+            "rows": 0, "cities": 0, "seconds": round(time.perf_counter() - started, 3),
+            "rows_per_sec": 0, "inserted": 0, "updated": 0, "unchanged": 0,
+            "indicators": 0, "skipped": True, "duplicate_of": duplicate_of,
+        }
+    elapsed = time.perf_counter() - started
+    stats = {
+        "rows": total,
+        "cities": len(state.city_ids),
+        "seconds": round(elapsed, 3),
+        "rows_per_sec": round(total / elapsed) if elapsed > 0 else total,
+        "inserted": state.inserted,
+        "updated": state.updated,
+        "unchanged": state.unchanged,
+        "indicators": indicators,
+        "skipped": False,
+    }
+    current_app.logger.info(
+        "Ingested %d rows for %d cities in %.3fs (%d rows/sec; %d inserted, %d updated, %d unchanged)",
+        stats["rows"], stats["cities"], elapsed, stats["rows_per_sec"],
+        stats["inserted"], stats["updated"], stats["unchanged"],
+    )
+    return state.city_ids, stats
+
+def load_csv(file_storage) -> City:
+    """Ingest a CSV and return the first city it contains (None if the file was a duplicate)"""
+    city_ids, _ = ingest_csv(file_storage)
+    return db.session.get(City, city_ids[0]) if city_ids else None
 
 def get_city_series(city_id: int):
-    obs = Observation.query.filter_by(city_id=city_id).order_by(Observation.id.asc()).all()
-    labels = [o.week_label for o in obs]
-    values = [o.cases for o in obs]
-    forecast = compute_forecast(values)
+    """Week labels, case counts and the (cached) forecast dict for a city"""
+    packed = city_series(city_id)
+    labels, values = packed.labels, packed.cases.tolist()
+    forecast = city_forecast(db.session.get(City, city_id), values)
     return labels, values, forecast
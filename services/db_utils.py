@@ -0,0 +1,9 @@
+# Rows sent per executemany round trip during bulk inserts
+INSERT_BATCH_SIZE = 5000
+# Keys per IN (...) clause; keeps us under SQLite's bound-parameter limit
+LOOKUP_BATCH_SIZE = 300
+
+def batches(items, size):
+    """Consecutive slices of ``items`` holding at most ``size`` elements"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,49 @@
+import numpy as np
+
+def lttb_indices(values, threshold):
+    """Positions kept by Largest-Triangle-Three-Buckets downsampling of ``values``.
+
+    x is the position in the series. The first and last points are always
+    kept; every bucket in between keeps the point forming the largest
+    triangle with the previously kept point and the next bucket's mean.
+    Returns all positions when the series is not longer than ``threshold``.
+    """
+    y = np.asarray(values, dtype="float64")
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    # Bucket edges over the interior points 1 .. n-2
+    edges = np.floor(np.linspace(1, n - 1, threshold - 1)).astype("int64")
+    x = np.arange(n, dtype="float64")
+    # Mean of each bucket (the last "next bucket" is the final point itself)
+    sums = np.concatenate([[0.0], np.cumsum(y)])
+    counts = np.diff(edges)
+    means_y = (sums[edges[1:]] - sums[edges[:-1]]) / counts
+    means_x = (edges[:-1] + edges[1:] - 1) / 2
+    next_x = np.append(means_x[1:], x[-1])
+    next_y = np.append(means_y[1:], y[-1])
+
+    kept = np.empty(threshold, dtype="int64")
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for b in range(threshold - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Twice the triangle area for every candidate in the bucket at once
+        area = np.abs((x[a] - next_x[b]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[b] - y[a]))
+        a = lo + int(np.argmax(area))
+        kept[b + 1] = a
+    return kept
+
+def window_slice(length, start=None, end=None) -> slice:
+    """Positions ``start`` through ``end`` (inclusive; None = open-ended) of a series of ``length`` weeks.
+
+    Positions rather than week labels: labels repeat every season, so a
+    window that crosses the new year is only unambiguous by position.
+    Raises ValueError for a position outside the series or an inverted window.
+    """
+    if start is not None and end is not None and end < start:
+        raise ValueError(f"Week {end} comes before week {start}")
+    for position in (start, end):
+        if position is not None and not 0 <= position < length:
+            raise ValueError(f"Week {position} is outside the series (0..{length - 1})")
+    return slice(0 if start is None else start, length if end is None else end + 1)
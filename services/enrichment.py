@@ -0,0 +1,42 @@
+import numpy as np
+
+# R(t) above these is HIGH / MEDIUM risk, otherwise LOW
+RISK_HIGH_RT = 1.2
+RISK_MEDIUM_RT = 1.0
+# Every risk level, highest first
+RISK_LEVELS = ("HIGH", "MEDIUM", "LOW")
+# Values at which each input saturates the 0-1 severity scale
+SEVERITY_RT_MAX = 3.0
+SEVERITY_R0_MAX = 5.0
+SEVERITY_HOSP_MAX = 10.0
+
+TREND_LABELS = np.array(["decreasing", "stable", "increasing"])
+
+def risk_levels(rt):
+    """'HIGH' / 'MEDIUM' / 'LOW' for each R(t)"""
+    rt = np.asarray(rt, dtype="float64")
+    return np.select([rt > RISK_HIGH_RT, rt > RISK_MEDIUM_RT], list(RISK_LEVELS[:2]), RISK_LEVELS[2])
+
+def severity_scores(rt, r0, hosp):
+    """Mean of R(t), R0 and hospitalization rate, each scaled to 0-1 (3 decimals)"""
+    parts = (
+        np.minimum(np.asarray(rt, dtype="float64") / SEVERITY_RT_MAX, 1.0),
+        np.minimum(np.asarray(r0, dtype="float64") / SEVERITY_R0_MAX, 1.0),
+        np.minimum(np.asarray(hosp, dtype="float64") / SEVERITY_HOSP_MAX, 1.0),
+    )
+    return np.round(sum(parts) / 3, 3)
+
+def case_density(cases):
+    """Weekly cases scaled by the series peak (0-1, 3 decimals); zeros when there are no cases"""
+    cases = np.asarray(cases, dtype="float64")
+    peak = cases.max() if cases.size else 0.0
+    if peak <= 0:
+        return np.zeros(cases.shape)
+    return np.round(cases / peak, 3)
+
+def trend_indicators(cases):
+    """Week-over-week direction; the first week is 'stable'"""
+    cases = np.asarray(cases, dtype="float64")
+    if not cases.size:
+        return np.array([], dtype=TREND_LABELS.dtype)
+    return TREND_LABELS[np.sign(np.diff(cases, prepend=cases[:1])).astype("int64") + 1]
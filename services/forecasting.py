@@ -0,0 +1,209 @@
+from statistics import NormalDist
+import numpy as np
+from flask import current_app, has_app_context
+from services.cache import LRUCache
+
+DEFAULT_MODEL = "holt"
+DEFAULT_HORIZON = 3
+# Coverage of the prediction interval
+DEFAULT_INTERVAL = 0.8
+
+# Holt (additive trend) smoothing constants are fitted per series over these
+# grids (lowest one-step-ahead squared error); series too short to score any
+# one-step error use the fallbacks
+HOLT_ALPHA_GRID = np.round(np.arange(0.1, 1.01, 0.1), 2)
+HOLT_BETA_GRID = np.round(np.arange(0.0, 0.91, 0.1), 2)
+HOLT_ALPHA = 0.5
+HOLT_BETA = 0.2
+# Trailing weeks the log-linear growth model is fitted on
+LOGLINEAR_WINDOW = 8
+# Weeks per season for the seasonal naive model
+SEASON_LENGTH = 52
+
+# Forecasts keyed by (city id, data version, model, horizon, interval); a new
+# upload bumps City.data_version so stale entries are simply never hit again
+_forecast_cache = LRUCache(maxsize=1024)
+
+def _first_columns(matrix, lengths):
+    return matrix.shape[1] - np.asarray(lengths, dtype="int64")
+
+def _holt(matrix, lengths, horizon):
+    """Additive-trend exponential smoothing with alpha and beta fitted per row.
+
+    Every (alpha, beta) pair of the grids runs at once, one recursion step
+    per week for all rows; each row keeps the pair with the lowest sum of
+    squared one-step-ahead errors.
+    """
+    rows, width = matrix.shape
+    first = _first_columns(matrix, lengths)[:, None]
+    alpha = np.repeat(HOLT_ALPHA_GRID, len(HOLT_BETA_GRID))[None, :]
+    beta = np.tile(HOLT_BETA_GRID, len(HOLT_ALPHA_GRID))[None, :]
+    level = np.zeros((rows, alpha.shape[1]))
+    trend = np.zeros_like(level)
+    sq_errors = np.zeros_like(level)
+    n_errors = np.zeros(rows)
+    for t in range(width):
+        x = matrix[:, t][:, None]
+        starting = first == t
+        active = first < t
+        # One-step-ahead errors once a trend has been observed
+        scored = first < t - 1
+        error = x - (level + trend)
+        sq_errors += np.where(scored, error ** 2, 0.0)
+        n_errors += scored[:, 0]
+        new_level = alpha * x + (1 - alpha) * (level + trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * trend
+        level = np.where(starting, x, np.where(active, new_level, level))
+        trend = np.where(active, new_trend, trend)
+
+    fallback = int(np.flatnonzero((alpha[0] == HOLT_ALPHA) & (beta[0] == HOLT_BETA))[0])
+    best = np.where(n_errors > 0, np.argmin(sq_errors, axis=1), fallback)
+    picked = np.arange(rows)
+    level, trend, sq_errors = level[picked, best], trend[picked, best], sq_errors[picked, best]
+    alpha, beta = alpha[0, best], beta[0, best]
+
+    steps = np.arange(1, horizon + 1)
+    point = level[:, None] + trend[:, None] * steps[None, :]
+    sigma = np.sqrt(np.divide(sq_errors, n_errors, out=np.zeros(rows), where=n_errors > 0))
+    # var_h = sigma^2 * (1 + sum_{j<h} alpha^2 (1 + j beta)^2)
+    terms = (alpha[:, None] * (1 + steps[None, :-1] * beta[:, None])) ** 2
+    growth = np.concatenate([np.zeros((rows, 1)), np.cumsum(terms, axis=1)], axis=1)
+    spread = sigma[:, None] * np.sqrt(1 + growth)
+    return point, spread, False
+
+def _loglinear(matrix, lengths, horizon):
+    """Least-squares line through log(1 + cases) over the trailing LOGLINEAR_WINDOW weeks"""
+    rows, width = matrix.shape
+    window = min(LOGLINEAR_WINDOW, width)
+    y = np.log1p(np.clip(matrix[:, -window:], 0, None))
+    t = np.arange(window, dtype="float64")
+    valid = t[None, :] >= (window - np.minimum(lengths, window))[:, None]
+    n = valid.sum(axis=1).astype("float64")
+    safe_n = np.maximum(n, 1)
+    t_mean = (valid * t).sum(axis=1) / safe_n
+    y_mean = (valid * y).sum(axis=1) / safe_n
+    dt = np.where(valid, t[None, :] - t_mean[:, None], 0.0)
+    sxx = (dt ** 2).sum(axis=1)
+    slope = np.divide((dt * (y - y_mean[:, None])).sum(axis=1), sxx, out=np.zeros(rows), where=sxx > 0)
+    intercept = y_mean - slope * t_mean
+    residuals = np.where(valid, y - (intercept[:, None] + slope[:, None] * t[None, :]), 0.0)
+    dof = np.maximum(n - 2, 1)
+    sigma = np.sqrt((residuals ** 2).sum(axis=1) / dof)
+
+    future = window - 1 + np.arange(1, horizon + 1, dtype="float64")
+    point = intercept[:, None] + slope[:, None] * future[None, :]
+    leverage = np.divide((future[None, :] - t_mean[:, None]) ** 2, sxx[:, None],
+                         out=np.zeros((rows, horizon)), where=sxx[:, None] > 0)
+    spread = sigma[:, None] * np.sqrt(1 + 1 / safe_n[:, None] + leverage)
+    return point, spread, True
+
+def _seasonal_naive(matrix, lengths, horizon):
+    """Same week one season earlier; plain last-value naive for series shorter than a season"""
+    rows, width = matrix.shape
+    lengths = np.asarray(lengths, dtype="int64")
+    first = _first_columns(matrix, lengths)
+    steps = np.arange(1, horizon + 1)
+    columns = np.arange(width)
+
+    naive = np.repeat(matrix[:, -1:], horizon, axis=1)
+    diffs = np.diff(matrix, axis=1)
+    diff_valid = columns[None, 1:] > first[:, None]
+    naive_n = diff_valid.sum(axis=1)
+    naive_sigma = np.sqrt(np.divide((np.where(diff_valid, diffs, 0.0) ** 2).sum(axis=1), naive_n,
+                                    out=np.zeros(rows), where=naive_n > 0))
+    point, spread = naive, naive_sigma[:, None] * np.sqrt(steps)[None, :]
+
+    if width > SEASON_LENGTH:
+        seasonal = matrix[:, width - SEASON_LENGTH + (steps - 1) % SEASON_LENGTH]
+        season_diffs = matrix[:, SEASON_LENGTH:] - matrix[:, :-SEASON_LENGTH]
+        season_valid = columns[None, :-SEASON_LENGTH] >= first[:, None]
+        season_n = season_valid.sum(axis=1)
+        season_sigma = np.sqrt(np.divide((np.where(season_valid, season_diffs, 0.0) ** 2).sum(axis=1),
+                                         season_n, out=np.zeros(rows), where=season_n > 0))
+        seasons_ahead = np.ceil(steps / SEASON_LENGTH)
+        has_season = (lengths > SEASON_LENGTH)[:, None]
+        point = np.where(has_season, seasonal, point)
+        spread = np.where(has_season, season_sigma[:, None] * np.sqrt(seasons_ahead)[None, :], spread)
+    return point, spread, False
+
+# name -> fit(matrix, lengths, horizon) returning (point, spread, log_scale)
+FORECAST_MODELS = {
+    "holt": _holt,
+    "loglinear": _loglinear,
+    "seasonal_naive": _seasonal_naive,
+}
+
+def forecast_settings() -> dict:
+    """Model, horizon and interval from the app config (module defaults outside an app context)"""
+    config = current_app.config if has_app_context() else {}
+    return {
+        "model": config.get("FORECAST_MODEL", DEFAULT_MODEL),
+        "horizon": int(config.get("FORECAST_HORIZON", DEFAULT_HORIZON)),
+        "interval": float(config.get("FORECAST_INTERVAL", DEFAULT_INTERVAL)),
+    }
+
+def forecast_matrix(matrix, lengths, model=DEFAULT_MODEL, horizon=DEFAULT_HORIZON, interval=DEFAULT_INTERVAL):
+    """Forecast every row of a right-aligned, zero-left-padded case matrix in one pass.
+
+    Returns a dict of (rows x horizon) arrays: point, lower and upper,
+    clipped at zero. Rows without data forecast zero cases.
+    """
+    if model not in FORECAST_MODELS:
+        raise ValueError(f"Unknown forecast model '{model}'; expected one of {sorted(FORECAST_MODELS)}")
+    matrix = np.asarray(matrix, dtype="float64")
+    point, spread, log_scale = FORECAST_MODELS[model](matrix, lengths, horizon)
+    z = NormalDist().inv_cdf(0.5 + interval / 2)
+    if log_scale:
+        lower, upper = np.expm1(point - z * spread), np.expm1(point + z * spread)
+        point = np.expm1(point)
+    else:
+        lower, upper = point - z * spread, point + z * spread
+    empty = (np.asarray(lengths) == 0)[:, None]
+    result = {}
+    for key, values in (("point", point), ("lower", lower), ("upper", upper)):
+        result[key] = np.where(empty, 0.0, np.clip(values, 0, None))
+    return result
+
+def forecast_series(values, model=None, horizon=None, interval=None) -> dict:
+    """Forecast one series (in week order); numbers are rounded to whole cases"""
+    settings = forecast_settings()
+    model = model or settings["model"]
+    horizon = settings["horizon"] if horizon is None else horizon
+    interval = settings["interval"] if interval is None else interval
+    values = np.asarray([] if values is None else values, dtype="float64")
+    matrix = (values if len(values) else np.zeros(1)).reshape(1, -1)
+    forecast = forecast_matrix(matrix, [len(values)], model, horizon, interval)
+    result = {key: np.rint(forecast[key][0]).astype("int64").tolist() for key in forecast}
+    result.update(model=model, horizon=horizon, interval=interval)
+    return result
+
+def city_forecast(city, values, model=None, horizon=None, interval=None) -> dict:
+    """Forecast for ``city``'s series, memoized per (city, data version, model, horizon, interval).
+
+    Treat the returned dict as read-only.
+    """
+    settings = forecast_settings()
+    model = model or settings["model"]
+    horizon = settings["horizon"] if horizon is None else horizon
+    interval = settings["interval"] if interval is None else interval
+    key = (city.id, city.data_version, model, horizon, interval)
+    return _forecast_cache.get_or_set(key, lambda: forecast_series(values, model, horizon, interval))
+
+def forecast_cities(cities, matrix, lengths, model=None, horizon=None, interval=None) -> dict:
+    """Batch-forecast ``cities`` (one matrix row each) in one pass and prime the cache.
+
+    Returns {city id: forecast dict}.
+    """
+    settings = forecast_settings()
+    model = model or settings["model"]
+    horizon = settings["horizon"] if horizon is None else horizon
+    interval = settings["interval"] if interval is None else interval
+    forecast = forecast_matrix(matrix, lengths, model, horizon, interval)
+    rounded = {key: np.rint(values).astype("int64") for key, values in forecast.items()}
+    results = {}
+    for row, city in enumerate(cities):
+        result = {key: rounded[key][row].tolist() for key in rounded}
+        result.update(model=model, horizon=horizon, interval=interval)
+        _forecast_cache.set((city.id, city.data_version, model, horizon, interval), result)
+        results[city.id] = result
+    return results
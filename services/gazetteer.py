@@ -0,0 +1,134 @@
+import os
+import re
+import unicodedata
+import pandas as pd
+from flask import current_app
+from sqlalchemy import bindparam, delete, insert, select, update
+from services.db_utils import INSERT_BATCH_SIZE, LOOKUP_BATCH_SIZE, batches
+from models import db, City, Place
+
+# Place files need at least these columns (state may be blank)
+PLACE_COLUMNS = ["name", "state", "country", "latitude", "longitude"]
+
+# Spellings of the same country that show up in uploads
+COUNTRY_ALIASES = {
+    "usa": "united states",
+    "us": "united states",
+    "united states of america": "united states",
+    "uk": "united kingdom",
+    "great britain": "united kingdom",
+    "brasil": "brazil",
+}
+
+def normalize(value) -> str:
+    """Accent- and case-insensitive lookup key: 'São Paulo' -> 'sao paulo'"""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return re.sub(r"[^0-9a-z]+", " ", text).strip()
+
+def normalize_country(value) -> str:
+    key = normalize(value)
+    return COUNTRY_ALIASES.get(key, key)
+
+def _normalize_series(values: pd.Series, country=False) -> pd.Series:
+    func = normalize_country if country else normalize
+    return values.fillna("").astype(str).map(func)
+
+def default_place_file() -> str:
+    return current_app.config.get("GAZETTEER_PATH") or os.path.join(current_app.root_path, "static", "gazetteer.csv")
+
+def load_places(path=None) -> int:
+    """Replace the Place table with the contents of a place CSV; returns the number of places"""
+    df = pd.read_csv(path or default_place_file(), dtype={"name": str, "state": str, "country": str})
+    df.columns = [c.lower().strip() for c in df.columns]
+    missing = set(PLACE_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Place file is missing columns: {sorted(missing)}")
+    df = df[PLACE_COLUMNS].dropna(subset=["name", "latitude", "longitude"])
+    df = df.assign(
+        state=df["state"].fillna(""),
+        country=df["country"].fillna(""),
+        name_key=_normalize_series(df["name"]),
+        state_key=_normalize_series(df["state"]),
+        country_key=_normalize_series(df["country"], country=True),
+    )
+    db.session.execute(delete(Place))
+    for batch in batches(df.to_dict("records"), INSERT_BATCH_SIZE):
+        db.session.execute(insert(Place), batch)
+    return len(df)
+
+def ensure_places():
+    """Load the bundled (or configured) place file the first time it is needed"""
+    if db.session.execute(select(Place.id).limit(1)).first() is None:
+        load_places()
+
+def _best_match(candidates, state_key, country_key):
+    """Prefer an exact (state, country) match, then the same country, then any place of that name"""
+    same_country = [c for c in candidates if c.country_key == country_key] if country_key else []
+    exact = [c for c in same_country if c.state_key == state_key] if state_key else []
+    for pool in (exact, same_country, candidates if not country_key else []):
+        if pool:
+            return pool[0].latitude, pool[0].longitude
+    return None
+
+def resolve_coordinates(keys) -> dict:
+    """Map (name, state, country) keys to (latitude, longitude) with set-based Place lookups.
+
+    Keys without a match are left out of the result.
+    """
+    normalized = {k: (normalize(k[0]), normalize(k[1]), normalize_country(k[2])) for k in keys}
+    names = sorted({n for n, _, _ in normalized.values() if n})
+    candidates = {}
+    for batch in batches(names, LOOKUP_BATCH_SIZE):
+        rows = db.session.execute(
+            select(Place.name_key, Place.state_key, Place.country_key, Place.latitude, Place.longitude)
+            .where(Place.name_key.in_(batch))
+            .order_by(Place.id)
+        )
+        for row in rows:
+            candidates.setdefault(row.name_key, []).append(row)
+    resolved = {}
+    for key, (name_key, state_key, country_key) in normalized.items():
+        match = _best_match(candidates.get(name_key, []), state_key, country_key)
+        if match is not None:
+            resolved[key] = match
+    return resolved
+
+def geocode_cities(city_ids=None, overwrite=False) -> int:
+    """Persist coordinates on City rows that do not have them yet (all of them when ``overwrite``).
+
+    ``city_ids`` limits the pass to those cities. Cities whose coordinates
+    change get their data_version bumped, so caches and ETags keyed on it
+    (Kepler payloads, API responses) pick up the new position. Returns the
+    number of cities whose coordinates changed.
+    """
+    ensure_places()
+    query = select(City.id, City.name, City.state, City.country, City.latitude, City.longitude)
+    if not overwrite:
+        query = query.where(City.latitude.is_(None))
+    rows = []
+    id_batches = batches(list(city_ids), LOOKUP_BATCH_SIZE) if city_ids is not None else [None]
+    for batch in id_batches:
+        scoped = query.where(City.id.in_(batch)) if batch is not None else query
+        rows.extend(db.session.execute(scoped))
+    if not rows:
+        return 0
+
+    coords = resolve_coordinates({(r.name, r.state, r.country) for r in rows})
+    params = [
+        {"b_id": r.id, "b_lat": coords[key][0], "b_lon": coords[key][1]}
+        for r in rows
+        for key in [(r.name, r.state, r.country)]
+        if key in coords and coords[key] != (r.latitude, r.longitude)
+    ]
+    table = City.__table__
+    for batch in batches(params, INSERT_BATCH_SIZE):
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("b_id"))
+            .values(latitude=bindparam("b_lat"), longitude=bindparam("b_lon"),
+                    data_version=table.c.data_version + 1),
+            batch,
+        )
+    return len(params)
@@ -0,0 +1,157 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+# Seconds a finished job (and its artifacts) is kept on disk (JOB_RETENTION)
+DEFAULT_RETENTION = 24 * 3600
+FINISHED_STATUSES = ("done", "failed")
+
+class JobStore:
+    """Filesystem-backed job table: one JSON document per job, replaced atomically"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, job_id):
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def artifact_path(self, job_id, suffix):
+        """Where a job keeps a file it produces (e.g. ``.zip``), next to its JSON document"""
+        return os.path.join(self.root, f"{job_id}{suffix}")
+
+    def _write(self, job):
+        tmp_path = self._path(job["id"]) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(job, fh)
+        os.replace(tmp_path, self._path(job["id"]))
+
+    def create(self, kind, **fields):
+        now = datetime.utcnow().isoformat()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "phase": "queued",
+            "rows_processed": 0,
+            "errors": [],
+            "result": None,
+            "created_at": now,
+            "updated_at": now,
+        }
+        job.update(fields)
+        with self._lock:
+            self._write(job)
+        return job
+
+    def get(self, job_id):
+        if not JOB_ID_PATTERN.match(job_id or ""):
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def update(self, job_id, **fields):
+        with self._lock:
+            job = self.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job["updated_at"] = datetime.utcnow().isoformat()
+            self._write(job)
+            return job
+
+    def expire(self, max_age):
+        """Delete finished jobs last updated more than ``max_age`` seconds ago, artifacts included.
+
+        Returns the number of jobs removed; queued and running jobs are kept.
+        """
+        cutoff = time.time() - max_age
+        files = {}
+        for name in os.listdir(self.root):
+            files.setdefault(name[:32], []).append(name)
+        removed = 0
+        with self._lock:
+            for job_id, names in files.items():
+                if not JOB_ID_PATTERN.match(job_id) or f"{job_id}.json" not in names:
+                    continue
+                try:
+                    if os.path.getmtime(self._path(job_id)) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    continue
+                job = self.get(job_id)
+                if job is None or job["status"] not in FINISHED_STATUSES:
+                    continue
+                # The JSON document goes last, so a half-expired job is retried next time
+                for name in sorted(names, key=lambda n: n == f"{job_id}.json"):
+                    try:
+                        os.remove(os.path.join(self.root, name))
+                    except FileNotFoundError:
+                        pass
+                removed += 1
+        return removed
+
+class JobQueue:
+    """Runs jobs on thread pools inside an application context.
+
+    ``lanes`` maps a job kind to its own worker count, so long jobs of that
+    kind (report batches) never queue up the others (uploads).
+    """
+
+    def __init__(self, app, store, workers, lanes=None, retention=DEFAULT_RETENTION):
+        self.app = app
+        self.store = store
+        self.retention = retention
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sante-job")
+        self.lanes = {kind: ThreadPoolExecutor(max_workers=count, thread_name_prefix=f"sante-{kind}")
+                      for kind, count in (lanes or {}).items()}
+
+    def create(self, kind, **fields):
+        # Every new job sweeps out the finished ones past their retention
+        self.store.expire(self.retention)
+        return self.store.create(kind, **fields)
+
+    def start(self, job_id, func, *args, **kwargs):
+        """Run ``func(job_id, *args, **kwargs)``; its return value becomes the job result"""
+        kind = (self.store.get(job_id) or {}).get("kind")
+        self.lanes.get(kind, self.executor).submit(self._run, job_id, func, args, kwargs)
+
+    def _run(self, job_id, func, args, kwargs):
+        with self.app.app_context():
+            self.store.update(job_id, status="running", phase="starting")
+            try:
+                result = func(job_id, *args, **kwargs)
+            except Exception as e:
+                self.app.logger.exception("Job %s failed", job_id)
+                job = self.store.get(job_id) or {}
+                self.store.update(job_id, status="failed", phase="failed",
+                                  errors=job.get("errors", []) + [str(e)])
+            else:
+                self.store.update(job_id, status="done", phase="done", result=result)
+
+    def progress(self, job_id, phase, rows_processed=None):
+        fields = {"phase": phase}
+        if rows_processed is not None:
+            fields["rows_processed"] = rows_processed
+        self.store.update(job_id, **fields)
+
+def init_app(app):
+    """Attach the job queue to ``app`` (workers and storage come from config)"""
+    store = JobStore(app.config["JOB_FOLDER"])
+    app.extensions["jobs"] = JobQueue(app, store, app.config.get("JOB_WORKERS", 1),
+                                      lanes={"reports": app.config.get("REPORT_BATCH_WORKERS", 1)},
+                                      retention=app.config.get("JOB_RETENTION", DEFAULT_RETENTION))
+
+def get_queue() -> JobQueue:
+    return current_app.extensions["jobs"]
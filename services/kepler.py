@@ -0,0 +1,53 @@
+from services.cache import LRUCache
+from services.enrichment import case_density, risk_levels, severity_scores, trend_indicators
+from services.series_store import city_series
+
+# Payloads keyed by (city id, data version, indicator id); a new upload bumps
+# City.data_version so stale entries are simply never hit again
+_payload_cache = LRUCache(maxsize=512)
+
+def build_kepler_payload(city, indicator):
+    """Columnar Kepler.gl payload: city/indicator constants once plus per-week arrays.
+
+    Risk level and severity come from the stored indicator; case density and
+    trend are derived from the case array in one vectorized pass.
+
+    Cached per (city, data version); treat the returned dict as read-only.
+    """
+    key = (city.id, city.data_version, indicator.id if indicator else None)
+    return _payload_cache.get_or_set(key, lambda: _build_payload(city, indicator))
+
+def _build_payload(city, indicator):
+    packed = city_series(city.id)
+    return {
+        "city": {
+            "id": city.id,
+            "name": city.name,
+            "state": city.state,
+            "country": city.country,
+            "latitude": city.latitude,
+            "longitude": city.longitude,
+        },
+        "indicator": indicator_fields(indicator),
+        "weeks": packed.labels,
+        "cases": packed.cases.tolist(),
+        "case_density": case_density(packed.cases).tolist(),
+        "trend_indicator": trend_indicators(packed.cases).tolist(),
+    }
+
+def indicator_fields(indicator):
+    """Risk level, severity and the raw indicator values (enriched on the fly for old rows)"""
+    if indicator is None:
+        return {key: None for key in ("rt", "r0", "hospitalization_rate", "risk_level", "severity_score")}
+    risk, severity = indicator.risk_level, indicator.severity_score
+    if risk is None or severity is None:
+        # Indicator stored before enrichment was persisted (see upgrade-db)
+        risk = str(risk_levels(indicator.rt))
+        severity = float(severity_scores(indicator.rt, indicator.r0, indicator.hospitalization_rate))
+    return {
+        "rt": indicator.rt,
+        "r0": indicator.r0,
+        "hospitalization_rate": indicator.hospitalization_rate,
+        "risk_level": risk,
+        "severity_score": severity,
+    }
@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, current_app, g, has_request_context, request
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds (seconds) of the latency buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upper bounds of the statements-per-request buckets
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+# Characters of each statement kept in the slow-request log
+SLOW_LOG_STATEMENT_CHARS = 200
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in Prometheus text format"""
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._series.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[index] += 1
+            self._series[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            pairs = [f'{label}="{_escape(value)}"' for label, value in zip(self.labels, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _labels(pairs + ['le="%s"' % le])
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(pairs)} {total}")
+            lines.append(f"{self.name}_count{_labels(pairs)} {cumulative}")
+        return "\n".join(lines)
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs):
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "sante_http_request_duration_seconds", "Request latency by endpoint.", ("endpoint", "method", "status"))
+HTTP_REQUEST_QUERIES = Histogram(
+    "sante_http_request_queries", "SQL statements issued per request.", ("endpoint",), COUNT_BUCKETS)
+SQL_QUERY_SECONDS = Histogram(
+    "sante_sql_query_duration_seconds", "SQL statement latency.", ("context",))
+OPENAI_REQUEST_SECONDS = Histogram(
+    "sante_openai_request_duration_seconds", "OpenAI call latency (streams: until the last token).", ("operation",))
+INGEST_PHASE_SECONDS = Histogram(
+    "sante_ingest_phase_duration_seconds", "Time spent in each CSV ingest phase.", ("phase",))
+
+REGISTRY = [HTTP_REQUEST_SECONDS, HTTP_REQUEST_QUERIES, SQL_QUERY_SECONDS, OPENAI_REQUEST_SECONDS,
+            INGEST_PHASE_SECONDS]
+
+class PhaseTimer:
+    """Times consecutive named phases: ``mark`` closes the running phase when a new one starts"""
+
+    def __init__(self, histogram=INGEST_PHASE_SECONDS):
+        self.histogram = histogram
+        self.phase = None
+        self.started = None
+
+    def mark(self, phase):
+        if phase == self.phase:
+            return
+        self.finish()
+        self.phase, self.started = phase, time.perf_counter()
+
+    def finish(self):
+        if self.phase is not None:
+            self.histogram.observe(time.perf_counter() - self.started, phase=self.phase)
+        self.phase = self.started = None
+
+def render_metrics() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("sante_query_start", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("sante_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    in_request = has_request_context()
+    SQL_QUERY_SECONDS.observe(elapsed, context="request" if in_request else "background")
+    if in_request and "sante_queries" in g:
+        g.sante_queries.append((elapsed, statement))
+
+def init_app(app):
+    """Time requests and SQL statements, and serve them on /metrics (unless METRICS_ENABLED=0)"""
+    if not app.config.get("METRICS_ENABLED", True):
+        return
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def _start_request_timer():
+        g.sante_request_started = time.perf_counter()
+        g.sante_queries = []
+
+    @app.after_request
+    def _record_request(response):
+        started = g.get("sante_request_started")
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        queries = g.get("sante_queries", [])
+        HTTP_REQUEST_SECONDS.observe(elapsed, endpoint=endpoint, method=request.method, status=response.status_code)
+        HTTP_REQUEST_QUERIES.observe(len(queries), endpoint=endpoint)
+        slow_ms = current_app.config.get("SLOW_REQUEST_MS", 0)
+        if slow_ms and elapsed * 1000 >= slow_ms:
+            current_app.logger.warning(
+                "Slow request %s %s: %.1f ms, %d queries (%.1f ms in SQL)\n%s",
+                request.method, request.path, elapsed * 1000, len(queries),
+                sum(q[0] for q in queries) * 1000,
+                "\n".join(f"  {q[0] * 1000:7.1f} ms  {' '.join(q[1].split())[:SLOW_LOG_STATEMENT_CHARS]}"
+                          for q in queries),
+            )
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        """Prometheus text exposition of the in-process histograms (login required unless METRICS_PUBLIC)"""
+        # Route names and OpenAI timings are internal; a scraper that cannot log in needs METRICS_PUBLIC=1
+        if not current_app.config.get("METRICS_PUBLIC") and not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,126 @@
+from itertools import groupby
+import pandas as pd
+from sqlalchemy import bindparam, inspect, select, text, update
+from services.weeks import week_index
+from services.csv_loader import refresh_latest_indicators
+from services.gazetteer import geocode_cities
+from services.enrichment import risk_levels, severity_scores
+from services.series_store import rebuild_series
+from services.city_summary import refresh_summaries
+from models import db, City, CitySeries, CitySummary, Indicator, Observation
+
+# Columns added to the baseline tables after the first release: (table, column, DDL type)
+ADDED_COLUMNS = [
+    ("observation", "week_idx", "INTEGER"),
+    ("city", "latest_indicator_id", "INTEGER"),
+    ("city", "data_version", "INTEGER NOT NULL DEFAULT 0"),
+    ("city", "latitude", "FLOAT"),
+    ("city", "longitude", "FLOAT"),
+    ("indicator", "risk_level", "VARCHAR(8)"),
+    ("indicator", "severity_score", "FLOAT"),
+]
+
+def _add_missing_columns():
+    inspector = inspect(db.engine)
+    for table, column, ddl in ADDED_COLUMNS:
+        existing = {c["name"] for c in inspector.get_columns(table)}
+        if column not in existing:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    db.session.commit()
+
+def _create_missing_indexes():
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def backfill_week_idx():
+    """Fill Observation.week_idx for rows written before the column existed"""
+    table = Observation.__table__
+    pending = select(table.c.city_id).where(table.c.week_idx.is_(None)).distinct()
+    rows = db.session.execute(
+        select(table.c.id, table.c.city_id, table.c.week_label)
+        .where(table.c.city_id.in_(pending))
+        .order_by(table.c.city_id, table.c.id)
+    )
+    updated = 0
+    for _, group in groupby(rows, key=lambda r: r.city_id):
+        group = list(group)
+        idx = week_index(pd.Series([r.week_label for r in group]))
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("b_id")).values(week_idx=bindparam("b_week_idx")),
+            [{"b_id": r.id, "b_week_idx": int(i)} for r, i in zip(group, idx)],
+        )
+        updated += len(group)
+    db.session.commit()
+    return updated
+
+def backfill_latest_indicators():
+    """Fill City.latest_indicator_id for cities ingested before the column existed"""
+    pending = [row.id for row in db.session.execute(
+        select(City.id).where(City.latest_indicator_id.is_(None))
+    )]
+    refresh_latest_indicators(pending)
+    db.session.commit()
+    return len(pending)
+
+def backfill_coordinates():
+    """Geocode cities ingested before coordinates were persisted"""
+    geocoded = geocode_cities()
+    db.session.commit()
+    return geocoded
+
+def backfill_indicator_enrichment():
+    """Fill Indicator.risk_level / severity_score for indicators stored before they existed"""
+    table = Indicator.__table__
+    rows = db.session.execute(
+        select(table.c.id, table.c.rt, table.c.r0, table.c.hospitalization_rate)
+        .where(table.c.risk_level.is_(None))
+    ).all()
+    if rows:
+        frame = pd.DataFrame(rows, columns=["id", "rt", "r0", "hosp"]).fillna(0.0)
+        risks = risk_levels(frame["rt"])
+        severities = severity_scores(frame["rt"], frame["r0"], frame["hosp"])
+        db.session.execute(
+            update(table).where(table.c.id == bindparam("b_id"))
+            .values(risk_level=bindparam("b_risk"), severity_score=bindparam("b_severity")),
+            [{"b_id": int(i), "b_risk": str(r), "b_severity": float(s)}
+             for i, r, s in zip(frame["id"], risks, severities)],
+        )
+    db.session.commit()
+    return len(rows)
+
+def backfill_series():
+    """Pack the series of cities with no (or a stale) CitySeries row"""
+    pending = [row.id for row in db.session.execute(
+        select(City.id)
+        .outerjoin(CitySeries, CitySeries.city_id == City.id)
+        .where((CitySeries.city_id.is_(None)) | (CitySeries.data_version != City.data_version))
+    )]
+    packed = rebuild_series(pending)
+    db.session.commit()
+    return packed
+
+def backfill_summaries():
+    """Summarize cities with no (or a stale) CitySummary row"""
+    pending = [row.id for row in db.session.execute(
+        select(City.id)
+        .outerjoin(CitySummary, CitySummary.city_id == City.id)
+        .where((CitySummary.city_id.is_(None)) | (CitySummary.data_version != City.data_version))
+    )]
+    summarized = refresh_summaries(pending)
+    db.session.commit()
+    return summarized
+
+def upgrade_db():
+    """Bring an existing database up to the current models (idempotent)"""
+    db.create_all()
+    _add_missing_columns()
+    _create_missing_indexes()
+    return {
+        "week_idx_backfilled": backfill_week_idx(),
+        "latest_indicators_backfilled": backfill_latest_indicators(),
+        "cities_geocoded": backfill_coordinates(),
+        "indicators_enriched": backfill_indicator_enrichment(),
+        "series_packed": backfill_series(),
+        "cities_summarized": backfill_summaries(),
+    }
@@ -0,0 +1,128 @@
+import random
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import openai
+from flask import current_app
+from sqlalchemy import select
+from models import db, City
+from services.db_utils import LOOKUP_BATCH_SIZE, batches
+from services.metrics import OPENAI_REQUEST_SECONDS
+from services.report_generator import get_generator
+from services.report_store import evict_reports, get_report, store_report
+
+DEFAULT_CONCURRENCY = 8
+# Extra attempts after the SDK's own retries give up on a 429
+DEFAULT_RATE_LIMIT_RETRIES = 5
+# Backoff in seconds, doubled per attempt (with jitter) when the API sends no retry-after
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+
+def _backoff(error, attempt):
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+def _complete(client, chat_request, retries):
+    """One chat completion, backing off on rate limits; runs on a worker thread (no DB access)"""
+    for attempt in range(retries + 1):
+        try:
+            with OPENAI_REQUEST_SECONDS.time(operation="batch_report"):
+                response = client.chat.completions.create(**chat_request)
+            return response.choices[0].message.content
+        except openai.RateLimitError as e:
+            if attempt == retries:
+                raise
+            time.sleep(_backoff(e, attempt))
+
+def reportable_city_ids():
+    """Cities with an indicator, i.e. those a dispatch report can be written for"""
+    return [row.id for row in db.session.execute(
+        select(City.id).where(City.latest_indicator_id.is_not(None)).order_by(City.id)
+    )]
+
+def generate_reports(city_ids=None, regenerate=False, concurrency=None, progress=None) -> dict:
+    """Dispatch reports for many cities (default: all) with up to ``concurrency`` API calls in flight.
+
+    Prompts are built and results stored on the calling thread; only the
+    API calls fan out. A failing city is recorded in ``errors`` and does not
+    stop the batch. ``progress(done, total)`` is called as cities finish.
+    Returns counts plus {city id: report text} for the finished reports.
+
+    Reports are stored without eviction while the batch runs and the store
+    is trimmed once at the end, sparing this batch's entries; the returned
+    texts do not depend on the store keeping them.
+    """
+    started = time.perf_counter()
+    config = current_app.config
+    concurrency = concurrency or int(config.get("REPORT_BATCH_CONCURRENCY", DEFAULT_CONCURRENCY))
+    retries = int(config.get("REPORT_BATCH_RETRIES", DEFAULT_RATE_LIMIT_RETRIES))
+    generator = get_generator()
+    # More workers than pooled connections would only queue inside the HTTP client
+    concurrency = max(1, min(concurrency, generator.pool_size))
+    client = generator.client
+    city_ids = reportable_city_ids() if city_ids is None else list(city_ids)
+
+    reports, errors, pending, keys = {}, {}, {}, []
+    cached = 0
+    for city_id in city_ids:
+        try:
+            prepared, error = generator.prepare_dispatch_request(city_id)
+        except Exception as e:
+            prepared, error = None, str(e)
+        if error:
+            errors[city_id] = error
+            continue
+        chat_request, key = prepared
+        keys.append(key)
+        report = None if regenerate else get_report(key)
+        if report is not None:
+            reports[city_id] = report
+            cached += 1
+            continue
+        pending[city_id] = (chat_request, key)
+
+    total = len(city_ids)
+    done = total - len(pending)
+    if progress:
+        progress(done, total)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sante-report") as executor:
+        futures = {executor.submit(_complete, client, chat_request, retries): city_id
+                   for city_id, (chat_request, _) in pending.items()}
+        for future in as_completed(futures):
+            city_id = futures[future]
+            key = pending[city_id][1]
+            try:
+                report = future.result()
+                store_report(key, city_id, generator.model, report, evict=False)
+                reports[city_id] = report
+            except Exception as e:
+                current_app.logger.warning("Report for city %s failed: %s", city_id, e)
+                errors[city_id] = str(e)
+            done += 1
+            if progress:
+                progress(done, total)
+    evict_reports(protect=keys)
+    db.session.commit()
+
+    return {
+        "cities": total,
+        "generated": len(reports) - cached,
+        "cached": cached,
+        "failed": len(errors),
+        "seconds": round(time.perf_counter() - started, 2),
+        "reports": reports,
+        "errors": errors,
+    }
+
+def write_reports_zip(reports, fh):
+    """Write {city id: report text} to ``fh`` as a zip archive, one TXT per city"""
+    city_ids = sorted(reports)
+    with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as archive:
+        for batch in batches(city_ids, LOOKUP_BATCH_SIZE):
+            cities = City.query.filter(City.id.in_(batch)).order_by(City.id)
+            for city in cities:
+                filename = f"dispatch_report_{city.name}_{city.state}_{city.country}_{city.id}.txt"
+                archive.writestr(filename, reports[city.id])
@@ -1,70 +1,176 @@
-import os
-from openai import OpenAI
+import atexit
+import re
+import threading
+import httpx
+from openai import DefaultHttpxClient, OpenAI
 from flask import current_app
-from models import City, Indicator, Observation
+from models import City, Observation
+from services.metrics import OPENAI_REQUEST_SECONDS
+from services.report_store import fingerprint, get_report, store_report
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MAX_RETRIES = 2
+
+# End of a sentence: terminal punctuation (optionally closed by a quote/bracket) before whitespace
+SENTENCE_END = re.compile(r'[.!?]["\')\]]?(?=\s|$)')
+
+def complete_sentences(text):
+    """Drop the unfinished sentence a max_tokens cut leaves at the end of ``text``.
+
+    Text without any sentence end is returned unchanged.
+    """
+    ends = [m.end() for m in SENTENCE_END.finditer(text or "")]
+    return text[:ends[-1]] if ends else text
 
 class ReportGenerator:
-    def __init__(self):
-        api_key = current_app.config.get('OPENAI_API_KEY')
-        if not api_key:
-            raise ValueError("OpenAI API key not configured")
+    """App-scoped service owning one pooled, thread-safe OpenAI client (see init_app)"""
+
+    def __init__(self, config):
+        self.api_key = config.get('OPENAI_API_KEY')
+        self.model = config.get('OPENAI_MODEL', 'gpt-4o-mini')
+        self.base_url = config.get('OPENAI_BASE_URL') or None
+        self.pool_size = int(config.get('OPENAI_POOL_SIZE', DEFAULT_POOL_SIZE))
+        self.timeout = float(config.get('OPENAI_TIMEOUT', DEFAULT_TIMEOUT))
+        # Retries use the SDK's exponential backoff (connection errors, 429 and 5xx)
+        self.max_retries = int(config.get('OPENAI_MAX_RETRIES', DEFAULT_MAX_RETRIES))
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Shared client, built on first use so apps without an API key still start"""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    if not self.api_key:
+                        raise ValueError("OpenAI API key not configured")
+                    http_client = DefaultHttpxClient(
+                        limits=httpx.Limits(max_connections=self.pool_size,
+                                            max_keepalive_connections=self.pool_size),
+                    )
+                    self._client = OpenAI(
+                        api_key=self.api_key,
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=self.max_retries,
+                        http_client=http_client,
+                    )
+        return self._client
+
+    def close(self):
+        """Close the pooled connections; the next use builds a fresh client"""
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def prepare_dispatch_request(self, city_id):
+        """Chat request and cache key for a city's report; returns ((request, key), error)"""
+        # Get city data
+        city = City.query.get(city_id)
+        if not city:
+            return None, "City not found"
         
-        self.client = OpenAI(api_key=api_key)
-        self.model = current_app.config.get('OPENAI_MODEL', 'gpt-4o-mini')
-    
-    def generate_dispatch_report(self, city_id):
-        """Generate an executive dispatch report for a city using OpenAI"""
+        # Get latest indicators
+        indicator = city.latest_indicator
+        if not indicator:
+            return None, "No indicators found for this city"
+        
+        # Get recent observations
+        observations = (Observation.query.filter_by(city_id=city_id)
+                        .order_by(Observation.week_idx.desc(), Observation.id.desc()).limit(10).all())
+        
+        # Prepare data for OpenAI
+        city_data = {
+            'name': city.name,
+            'state': city.state,
+            'country': city.country,
+            'rt': indicator.rt,
+            'r0': indicator.r0,
+            'hospitalization_rate': indicator.hospitalization_rate,
+            'recent_cases': [obs.cases for obs in observations],
+            'recent_weeks': [obs.week_label for obs in observations]
+        }
+        
+        # Create prompt for OpenAI
+        prompt = self._create_prompt(city_data)
+        
+        chat_request = {
+            "model": self.model,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": "You are an expert epidemiologist and public health analyst. Generate concise, professional executive reports for health officials and stakeholders."
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ],
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+        key = fingerprint({"city_id": city.id, "data_version": city.data_version, "indicator_id": indicator.id, **chat_request})
+        return (chat_request, key), None
+
+    def generate_dispatch_report(self, city_id, regenerate=False):
+        """Generate an executive dispatch report for a city using OpenAI.
+
+        Reports are stored by a fingerprint of the request, so identical
+        inputs are served from services.report_store unless ``regenerate``.
+        """
         try:
-            # Get city data
-            city = City.query.get(city_id)
-            if not city:
-                return None, "City not found"
-            
-            # Get latest indicators
-            indicator = Indicator.query.filter_by(city_id=city_id).order_by(Indicator.id.desc()).first()
-            if not indicator:
-                return None, "No indicators found for this city"
-            
-            # Get recent observations
-            observations = Observation.query.filter_by(city_id=city_id).order_by(Observation.week_label.desc()).limit(10).all()
-            
-            # Prepare data for OpenAI
-            city_data = {
-                'name': city.name,
-                'state': city.state,
-                'country': city.country,
-                'rt': indicator.rt,
-                'r0': indicator.r0,
-                'hospitalization_rate': indicator.hospitalization_rate,
-                'recent_cases': [obs.cases for obs in observations],
-                'recent_weeks': [obs.week_label for obs in observations]
-            }
-            
-            # Create prompt for OpenAI
-            prompt = self._create_prompt(city_data)
-            
+            prepared, error = self.prepare_dispatch_request(city_id)
+            if error:
+                return None, error
+            chat_request, key = prepared
+            if not regenerate:
+                report = get_report(key)
+                if report is not None:
+                    return report, None
+
             # Generate report with OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are an expert epidemiologist and public health analyst. Generate concise, professional executive reports for health officials and stakeholders."
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            
+            with OPENAI_REQUEST_SECONDS.time(operation="dispatch_report"):
+                response = self.client.chat.completions.create(**chat_request)
+
             report = response.choices[0].message.content
+            store_report(key, city_id, self.model, report)
             return report, None
             
         except Exception as e:
             return None, f"Error generating report: {str(e)}"
+
+    def stream_dispatch_report(self, city_id, regenerate=False):
+        """Streaming variant of generate_dispatch_report; returns (text chunk iterator, error).
+
+        Chunks are forwarded as the API produces them; the full text is
+        stored once the stream completes. A cached report is one chunk.
+        """
+        try:
+            prepared, error = self.prepare_dispatch_request(city_id)
+        except Exception as e:
+            return None, f"Error generating report: {str(e)}"
+        if error:
+            return None, error
+        chat_request, key = prepared
+
+        def chunks():
+            if not regenerate:
+                report = get_report(key)
+                if report is not None:
+                    yield report
+                    return
+            parts = []
+            with OPENAI_REQUEST_SECONDS.time(operation="dispatch_report_stream"):
+                for event in self.client.chat.completions.create(**chat_request, stream=True):
+                    delta = event.choices[0].delta.content if event.choices else None
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+            store_report(key, city_id, self.model, "".join(parts))
+
+        return chunks(), None
     
     def _create_prompt(self, city_data):
         """Create a detailed prompt for OpenAI based on city data"""
@@ -92,169 +198,74 @@ Format the report professionally for distribution to health authorities and stak
         """
         return prompt.strip()
     
-    def process_kepler_data(self, raw_data, city, indicator):
-        """Process epidemiological data with OpenAI to enhance it for Kepler.gl visualization"""
+    def kepler_narrative(self, payload, regenerate=False):
+        """Short written annotation of an (already enriched) Kepler payload; returns (text, error).
+
+        The map columns are computed server-side (services.enrichment); the
+        model only writes prose. Stored in the report cache like dispatch reports.
+        """
         try:
-            # Prepare data summary for OpenAI
-            data_summary = {
-                'city_name': city.name,
-                'state': city.state,
-                'country': city.country,
-                'rt': indicator.rt,
-                'r0': indicator.r0,
-                'hospitalization_rate': indicator.hospitalization_rate,
-                'data_points': len(raw_data),
-                'coordinate_range': {
-                    'lat_min': min(d['latitude'] for d in raw_data),
-                    'lat_max': max(d['latitude'] for d in raw_data),
-                    'lon_min': min(d['longitude'] for d in raw_data),
-                    'lon_max': max(d['longitude'] for d in raw_data)
-                }
-            }
-            
-            # Create prompt for OpenAI
-            prompt = self._create_kepler_prompt(raw_data, data_summary)
-            
-            # Generate enhanced data with OpenAI
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
+            chat_request = {
+                "model": self.model,
+                "messages": [
                     {
                         "role": "system",
-                        "content": "You are a data scientist specializing in geospatial data visualization. Your task is to enhance epidemiological data for optimal display in Kepler.gl mapping software."
+                        "content": "You are an epidemiologist annotating a geospatial dashboard. Write short, factual narrative for public health officials."
                     },
                     {
                         "role": "user",
-                        "content": prompt
+                        "content": self._create_kepler_prompt(payload)
                     }
                 ],
-                max_tokens=2000,
-                temperature=0.3
-            )
-            
-            # Parse the response and return enhanced data
-            enhanced_data = self._parse_kepler_response(response.choices[0].message.content, raw_data)
-            return enhanced_data, None
-            
+                "max_tokens": 400,
+                "temperature": 0.3
+            }
+            key = fingerprint({"kind": "kepler_narrative", **chat_request})
+            if not regenerate:
+                narrative = get_report(key)
+                if narrative is not None:
+                    return narrative, None
+
+            with OPENAI_REQUEST_SECONDS.time(operation="kepler_narrative"):
+                response = self.client.chat.completions.create(**chat_request)
+            choice = response.choices[0]
+            narrative = choice.message.content
+            if choice.finish_reason == "length":
+                # Keep what the model finished instead of a dangling half sentence
+                narrative = complete_sentences(narrative)
+            store_report(key, payload["city"]["id"], self.model, narrative)
+            return narrative, None
+
         except Exception as e:
-            return None, f"Error processing data with OpenAI: {str(e)}"
+            return None, f"Error generating narrative with OpenAI: {str(e)}"
     
-    def _create_kepler_prompt(self, raw_data, data_summary):
-        """Create a prompt for OpenAI to enhance Kepler.gl data"""
+    def _create_kepler_prompt(self, payload):
+        """Prompt summarizing the enriched series (not the raw rows)"""
+        city, ind = payload["city"], payload["indicator"]
+        recent = list(zip(payload["weeks"], payload["cases"], payload["trend_indicator"]))[-5:]
+        peak = max(payload["cases"]) if payload["cases"] else 0
         prompt = f"""
-You are processing epidemiological data for visualization in Kepler.gl, a powerful geospatial mapping tool.
-
-Current Data Summary:
-- City: {data_summary['city_name']}, {data_summary['state']}, {data_summary['country']}
-- R(t): {data_summary['rt']} (transmission rate)
-- R0: {data_summary['r0']} (basic reproduction number)
-- Hospitalization Rate: {data_summary['hospitalization_rate']}%
-- Data Points: {data_summary['data_points']} weeks
-- Coordinate Range: Lat {data_summary['coordinate_range']['lat_min']:.4f} to {data_summary['coordinate_range']['lat_max']:.4f}, Lon {data_summary['coordinate_range']['lon_min']:.4f} to {data_summary['coordinate_range']['lon_max']:.4f}
-
-Raw Data Sample (first 3 entries):
-{raw_data[:3]}
+Annotate the epidemiological map for {city['name']}, {city['state']}, {city['country']}.
 
-Your Task:
-Enhance this data for optimal visualization in Kepler.gl by:
+Computed indicators:
+- Risk Level: {ind['risk_level']}
+- Severity Score (0-1): {ind['severity_score']}
+- R(t): {ind['rt']}
+- R0: {ind['r0']}
+- Hospitalization Rate: {ind['hospitalization_rate']}%
+- Weeks of data: {len(payload['weeks'])}, peak weekly cases: {peak}
+- Last weeks (week, cases, trend): {recent}
 
-1. **Data Validation**: Ensure all coordinates are valid and within reasonable ranges
-2. **Data Enhancement**: Add derived fields that would be useful for mapping:
-   - risk_level: "HIGH" (R(t) > 1.2), "MEDIUM" (R(t) > 1.0), "LOW" (R(t) ≤ 1.0)
-   - case_density: cases per week normalized to a 0-1 scale
-   - trend_indicator: "increasing", "stable", or "decreasing" based on case trends
-   - severity_score: combined score based on R(t), R0, and hospitalization rate
-3. **Geospatial Optimization**: Ensure coordinates are precise and suitable for mapping
-4. **Data Consistency**: Verify all required fields are present and properly formatted
-
-Return the enhanced data as a JSON array with the same structure as the input, plus the new derived fields. Maintain the exact same data types and ensure all coordinates are valid decimal degrees.
-
-Example output format:
-[
-  {{
-    "week": "Week 1",
-    "cases": 150,
-    "city_name": "City Name",
-    "state": "State",
-    "country": "Country",
-    "latitude": 40.7128,
-    "longitude": -74.0060,
-    "rt": 1.15,
-    "r0": 2.5,
-    "hospitalization_rate": 3.2,
-    "risk_level": "MEDIUM",
-    "case_density": 0.75,
-    "trend_indicator": "increasing",
-    "severity_score": 0.68
-  }}
-]
-
-Ensure the response is valid JSON that can be parsed directly.
+Write 3-4 sentences describing the situation the map shows, what stands out, and what to watch next. Do not repeat the numbers as a list.
         """
         return prompt.strip()
-    
-    def _parse_kepler_response(self, openai_response, original_data):
-        """Parse OpenAI response and merge with original data"""
-        try:
-            import json
-            
-            # Try to extract JSON from the response
-            response_text = openai_response.strip()
-            
-            # Find JSON array in the response
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                enhanced_data = json.loads(json_str)
-                
-                # Validate and merge with original data
-                if len(enhanced_data) == len(original_data):
-                    return enhanced_data
-                else:
-                    # If parsing fails, return original data with basic enhancements
-                    return self._enhance_data_basic(original_data)
-            else:
-                # If no JSON found, return original data with basic enhancements
-                return self._enhance_data_basic(original_data)
-                
-        except (json.JSONDecodeError, KeyError, IndexError):
-            # If parsing fails, return original data with basic enhancements
-            return self._enhance_data_basic(original_data)
-    
-    def _enhance_data_basic(self, original_data):
-        """Add basic enhancements to data if OpenAI processing fails"""
-        enhanced_data = []
-        
-        for i, entry in enumerate(original_data):
-            # Calculate basic derived fields
-            risk_level = "HIGH" if entry['rt'] > 1.2 else "MEDIUM" if entry['rt'] > 1.0 else "LOW"
-            
-            # Calculate case density (normalized to 0-1 scale)
-            max_cases = max(d['cases'] for d in original_data)
-            case_density = entry['cases'] / max_cases if max_cases > 0 else 0
-            
-            # Determine trend indicator
-            if i > 0:
-                trend = "increasing" if entry['cases'] > original_data[i-1]['cases'] else "decreasing" if entry['cases'] < original_data[i-1]['cases'] else "stable"
-            else:
-                trend = "stable"
-            
-            # Calculate severity score (0-1 scale)
-            rt_score = min(entry['rt'] / 3.0, 1.0)  # Normalize R(t) to 0-1
-            r0_score = min(entry['r0'] / 5.0, 1.0)  # Normalize R0 to 0-1
-            hosp_score = min(entry['hospitalization_rate'] / 10.0, 1.0)  # Normalize hospitalization to 0-1
-            severity_score = (rt_score + r0_score + hosp_score) / 3
-            
-            enhanced_entry = entry.copy()
-            enhanced_entry.update({
-                'risk_level': risk_level,
-                'case_density': round(case_density, 3),
-                'trend_indicator': trend,
-                'severity_score': round(severity_score, 3)
-            })
-            
-            enhanced_data.append(enhanced_entry)
-        
-        return enhanced_data
+
+def init_app(app):
+    """Attach the shared report generator to ``app`` (client settings come from config)"""
+    generator = ReportGenerator(app.config)
+    app.extensions["report_generator"] = generator
+    # The client lives as long as the process, so its pool is released at interpreter exit
+    atexit.register(generator.close)
+
+def get_generator() -> ReportGenerator:
+    return current_app.extensions["report_generator"]
@@ -0,0 +1,84 @@
+import hashlib
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, select
+from services.db_utils import LOOKUP_BATCH_SIZE, batches
+from models import db, CachedReport
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 500
+
+def fingerprint(inputs: dict) -> str:
+    """Stable hash of everything that shapes a report (prompt, model, sampling settings)"""
+    blob = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+def _ttl():
+    return int(current_app.config.get("REPORT_CACHE_TTL", DEFAULT_TTL))
+
+def get_report(key: str):
+    """Stored report for ``key``, or None when missing or older than REPORT_CACHE_TTL"""
+    entry = CachedReport.query.filter_by(fingerprint=key).first()
+    if entry is None:
+        return None
+    now = datetime.utcnow()
+    ttl = _ttl()
+    if ttl and entry.created_at < now - timedelta(seconds=ttl):
+        db.session.delete(entry)
+        db.session.commit()
+        return None
+    entry.last_used_at = now
+    db.session.commit()
+    return entry.report
+
+def store_report(key: str, city_id: int, model: str, report: str, evict=True):
+    """Save (or refresh) a report, then evict the least recently used beyond REPORT_CACHE_MAX_ENTRIES.
+
+    Batches pass ``evict=False`` and call evict_reports once at the end,
+    so a run larger than the cap cannot push out its own reports.
+    """
+    now = datetime.utcnow()
+    entry = CachedReport.query.filter_by(fingerprint=key).first()
+    if entry is None:
+        entry = CachedReport(fingerprint=key, city_id=city_id)
+        db.session.add(entry)
+    entry.model = model
+    entry.report = report
+    entry.created_at = now
+    entry.last_used_at = now
+    db.session.flush()
+    if evict:
+        evict_reports()
+    db.session.commit()
+
+def evict_reports(protect=()):
+    """Drop expired reports and the least recently used beyond REPORT_CACHE_MAX_ENTRIES.
+
+    Fingerprints in ``protect`` are kept regardless; the caller commits.
+    """
+    ttl = _ttl()
+    if ttl:
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl)
+        db.session.execute(
+            delete(CachedReport).where(CachedReport.created_at < cutoff)
+            .execution_options(synchronize_session=False)
+        )
+    max_entries = int(current_app.config.get("REPORT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+    keep = (select(CachedReport.id)
+            .order_by(CachedReport.last_used_at.desc(), CachedReport.id.desc())
+            .limit(max_entries))
+    stmt = delete(CachedReport).where(CachedReport.id.not_in(keep))
+    protect = list(protect)
+    for batch in batches(protect, LOOKUP_BATCH_SIZE):
+        stmt = stmt.where(CachedReport.fingerprint.not_in(batch))
+    db.session.execute(stmt.execution_options(synchronize_session=False))
+
+def clear_reports(city_id=None) -> int:
+    """Drop stored reports (all, or one city's); returns the number removed"""
+    stmt = delete(CachedReport)
+    if city_id is not None:
+        stmt = stmt.where(CachedReport.city_id == city_id)
+    removed = db.session.execute(stmt.execution_options(synchronize_session=False)).rowcount
+    db.session.commit()
+    return removed
@@ -0,0 +1,99 @@
+import math
+from functools import lru_cache
+import numpy as np
+from flask import current_app, has_app_context
+
+# Serial interval (weeks between successive cases, gamma distributed) and the
+# number of weeks pooled into each R(t) estimate; overridable via config
+DEFAULT_SI_MEAN = 2.0
+DEFAULT_SI_SD = 1.0
+DEFAULT_WINDOW = 3
+# Gamma prior on R with mean 5 and sd 5 (Cori et al., 2013)
+PRIOR_SHAPE = 1.0
+PRIOR_SCALE = 5.0
+# Normal quantile of the two-sided 95% credible band
+BAND_Z = 1.959964
+# Serial-interval weights below this share are dropped from the tail
+SI_MIN_WEIGHT = 1e-3
+
+def rt_settings() -> dict:
+    """Estimator settings from the app config (module defaults outside an app context)"""
+    config = current_app.config if has_app_context() else {}
+    return {
+        "si_mean": float(config.get("RT_SI_MEAN", DEFAULT_SI_MEAN)),
+        "si_sd": float(config.get("RT_SI_SD", DEFAULT_SI_SD)),
+        "window": int(config.get("RT_WINDOW", DEFAULT_WINDOW)),
+    }
+
+@lru_cache(maxsize=32)
+def serial_interval_weights(si_mean, si_sd) -> np.ndarray:
+    """Discretized gamma serial interval: ``w[s - 1]`` is the weight of cases ``s`` weeks back"""
+    shape = (si_mean / si_sd) ** 2
+    scale = si_sd ** 2 / si_mean
+    lags = np.arange(1, max(2, math.ceil(si_mean + 6 * si_sd)) + 1, dtype="float64")
+    log_pdf = (shape - 1) * np.log(lags) - lags / scale - math.lgamma(shape) - shape * math.log(scale)
+    weights = np.exp(log_pdf)
+    weights /= weights.sum()
+    keep = np.nonzero(weights >= SI_MIN_WEIGHT)[0]
+    weights = weights[:keep[-1] + 1] if len(keep) else weights[:1]
+    weights = weights / weights.sum()
+    weights.setflags(write=False)
+    return weights
+
+def history_length(settings=None) -> int:
+    """Weeks of input behind each R(t) estimate: the pooling window plus the serial-interval lags"""
+    settings = settings or rt_settings()
+    return settings["window"] + len(serial_interval_weights(settings["si_mean"], settings["si_sd"]))
+
+def _window_sum(values, window):
+    """Trailing ``window``-column sums along axis 1 from one cumulative sum"""
+    total = np.cumsum(values, axis=1)
+    total[:, window:] = total[:, window:] - total[:, :-window]
+    return total
+
+def estimate_rt_matrix(matrix, lengths, si_mean=DEFAULT_SI_MEAN, si_sd=DEFAULT_SI_SD, window=DEFAULT_WINDOW):
+    """Renewal-equation (Cori) R(t) for every row of a right-aligned, zero-left-padded case matrix.
+
+    The posterior of R over each trailing window is
+    Gamma(PRIOR_SHAPE + sum(cases), 1 / PRIOR_SCALE + sum(infectiousness)),
+    with infectiousness the serial-interval-weighted sum of earlier cases.
+    Returns a dict of arrays shaped like ``matrix``: mean, lower and upper
+    (95% band); entries without a full window of data are NaN.
+    """
+    cases = np.asarray(matrix, dtype="float64")
+    rows, width = cases.shape
+    weights = serial_interval_weights(si_mean, si_sd)
+    infectiousness = np.zeros_like(cases)
+    for lag, weight in enumerate(weights, start=1):
+        if lag >= width:
+            break
+        infectiousness[:, lag:] += weight * cases[:, :-lag]
+
+    pooled_infectiousness = _window_sum(infectiousness, window)
+    shape = PRIOR_SHAPE + _window_sum(cases, window)
+    rate = 1.0 / PRIOR_SCALE + pooled_infectiousness
+    mean = shape / rate
+    # Wilson-Hilferty approximation of the gamma quantiles
+    k = 1.0 / (9.0 * shape)
+    lower = shape * np.clip(1 - k - BAND_Z * np.sqrt(k), 0, None) ** 3 / rate
+    upper = shape * (1 - k + BAND_Z * np.sqrt(k)) ** 3 / rate
+
+    # The window must sit inside the real data after its first week, and carry some infectiousness
+    first = width - np.asarray(lengths, dtype="int64")
+    valid = (np.arange(width)[None, :] >= (first + window)[:, None]) & (pooled_infectiousness > 1e-9)
+    for values in (mean, lower, upper):
+        values[~valid] = np.nan
+    return {"mean": mean, "lower": lower, "upper": upper}
+
+def estimate_rt(cases, settings=None) -> dict:
+    """Full R(t) series for one city's cases (in week order); see estimate_rt_matrix"""
+    cases = np.asarray([] if cases is None else cases, dtype="float64").reshape(1, -1)
+    estimate = estimate_rt_matrix(cases, [cases.shape[1]], **(settings or rt_settings()))
+    return {key: values[0] for key, values in estimate.items()}
+
+def as_chart_series(estimate, digits=3) -> dict:
+    """JSON-friendly copy of an estimate: rounded floats, None where undefined"""
+    return {
+        key: [None if np.isnan(v) else round(float(v), digits) for v in values]
+        for key, values in estimate.items()
+    }
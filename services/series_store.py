@@ -0,0 +1,99 @@
+from itertools import groupby
+from typing import NamedTuple
+import numpy as np
+from sqlalchemy import delete, insert, select
+from services.db_utils import LOOKUP_BATCH_SIZE, batches
+from models import db, City, CitySeries, Observation
+
+# Little-endian int64 for both packed arrays
+PACKED_DTYPE = np.dtype("<i8")
+# Week labels are stored joined by the ASCII unit separator
+LABEL_SEPARATOR = "\x1f"
+
+class PackedSeries(NamedTuple):
+    """One city's series in week order; the arrays are read-only views of the stored bytes"""
+    labels: list
+    week_idx: np.ndarray
+    cases: np.ndarray
+
+EMPTY_SERIES = PackedSeries([], np.empty(0, PACKED_DTYPE), np.empty(0, PACKED_DTYPE))
+
+def _pack(city_id, version, rows):
+    return {
+        "city_id": city_id,
+        "data_version": version,
+        "length": len(rows),
+        "labels": LABEL_SEPARATOR.join(r.week_label for r in rows),
+        # Rows written before week_idx existed sort first, as in the Observation query
+        "week_idx": np.array([r.week_idx if r.week_idx is not None else -1 for r in rows],
+                             dtype=PACKED_DTYPE).tobytes(),
+        "cases": np.array([r.cases for r in rows], dtype=PACKED_DTYPE).tobytes(),
+    }
+
+def _unpack(row) -> PackedSeries:
+    if not row.length:
+        return EMPTY_SERIES
+    return PackedSeries(
+        row.labels.split(LABEL_SEPARATOR),
+        np.frombuffer(row.week_idx, dtype=PACKED_DTYPE),
+        np.frombuffer(row.cases, dtype=PACKED_DTYPE),
+    )
+
+def rebuild_series(city_ids=None) -> int:
+    """Re-pack the series of ``city_ids`` (every city when None) from Observation; returns cities packed.
+
+    Observation stays the source of truth: call this whenever a city's rows
+    change (ingest does) and its City.data_version has been bumped.
+    """
+    if city_ids is None:
+        city_ids = [row.id for row in db.session.execute(select(City.id))]
+    table = Observation.__table__
+    packed = 0
+    for batch in batches(list(city_ids), LOOKUP_BATCH_SIZE):
+        versions = dict(db.session.execute(
+            select(City.id, City.data_version).where(City.id.in_(batch))
+        ).all())
+        rows = db.session.execute(
+            select(table.c.city_id, table.c.week_label, table.c.week_idx, table.c.cases)
+            .where(table.c.city_id.in_(batch))
+            .order_by(table.c.city_id, table.c.week_idx, table.c.id)
+        )
+        series = {city_id: list(group) for city_id, group in groupby(rows, key=lambda r: r.city_id)}
+        db.session.execute(delete(CitySeries).where(CitySeries.city_id.in_(batch))
+                           .execution_options(synchronize_session=False))
+        payload = [_pack(city_id, version, series.get(city_id, [])) for city_id, version in versions.items()]
+        if payload:
+            db.session.execute(insert(CitySeries.__table__), payload)
+        packed += len(payload)
+    return packed
+
+def load_series(city_ids, commit=True) -> dict:
+    """{city id: PackedSeries} for existing cities, re-packing any whose store is missing or stale.
+
+    Pass ``commit=False`` inside a larger transaction (ingest) so the
+    re-pack is committed, or rolled back, along with it.
+    """
+    city_ids = list(city_ids)
+    found, stale = {}, []
+    for batch in batches(city_ids, LOOKUP_BATCH_SIZE):
+        rows = db.session.execute(
+            select(City.id, City.data_version, CitySeries.data_version.label("packed_version"),
+                   CitySeries.length, CitySeries.labels, CitySeries.week_idx, CitySeries.cases)
+            .outerjoin(CitySeries, CitySeries.city_id == City.id)
+            .where(City.id.in_(batch))
+        ).all()
+        for row in rows:
+            if row.packed_version is None or row.packed_version != row.data_version:
+                stale.append(row.id)
+            else:
+                found[row.id] = _unpack(row)
+    if stale:
+        rebuild_series(stale)
+        if commit:
+            db.session.commit()
+        found.update(load_series(stale, commit))
+    return found
+
+def city_series(city_id) -> PackedSeries:
+    """One city's packed series (empty for an unknown city)"""
+    return load_series([city_id]).get(city_id, EMPTY_SERIES)
@@ -0,0 +1,172 @@
+from sqlalchemy import and_, case, func, or_, select
+from services.enrichment import RISK_LEVELS
+from models import db, City, CitySummary
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Stored geohash length (cells of roughly 38 x 19 m)
+GEOHASH_PRECISION = 8
+# (zoom below which, geohash length) used to cluster; about four cells per map tile
+CLUSTER_PRECISIONS = ((2, 1), (4, 2), (7, 3), (9, 4))
+# Finest clustering level between the table above and MAP_CLUSTER_MAX_ZOOM
+FINEST_CLUSTER_PRECISION = 5
+# From this zoom on cities are returned one by one (MAP_CLUSTER_MAX_ZOOM)
+DEFAULT_CLUSTER_MAX_ZOOM = 11
+# Most cities returned unclustered per viewport (MAP_MAX_CITIES)
+DEFAULT_MAX_CITIES = 2000
+# Most geohash cells a viewport is covered with; the finest precision that fits is used
+MAX_COVER_CELLS = 16
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Base-32 geohash of a point; cities sharing a prefix share that grid cell"""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+def cluster_precision(zoom):
+    """Geohash prefix length cities are grouped by at ``zoom``"""
+    for below, precision in CLUSTER_PRECISIONS:
+        if zoom < below:
+            return precision
+    return FINEST_CLUSTER_PRECISION
+
+def parse_bbox(text):
+    """``west,south,east,north`` in degrees; west > east crosses the antimeridian. Raises ValueError."""
+    try:
+        west, south, east, north = (float(part) for part in text.split(","))
+    except (AttributeError, ValueError):
+        raise ValueError("bbox must be west,south,east,north") from None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        raise ValueError("bbox is outside -180..180 / -90..90 or south > north")
+    return west, south, east, north
+
+def _grid(precision):
+    """(columns, rows) of the geohash grid at ``precision``; longitude takes the odd bit"""
+    bits = 5 * precision
+    return 2 ** ((bits + 1) // 2), 2 ** (bits // 2)
+
+def _spans(low, high, cells, origin, extent):
+    """Grid indexes from ``low`` through ``high`` degrees, ``cells`` over ``extent`` from ``origin``"""
+    size = extent / cells
+    first = min(int((low - origin) // size), cells - 1)
+    last = min(int((high - origin) // size), cells - 1)
+    return range(first, last + 1)
+
+def _next_prefix(prefix):
+    """Smallest geohash prefix sorting after every hash that starts with ``prefix`` (None: none does)"""
+    prefix = prefix.rstrip(GEOHASH_ALPHABET[-1])
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+def cover_ranges(bbox, max_cells=MAX_COVER_CELLS):
+    """[start, stop) geohash ranges covering ``bbox`` with at most ``max_cells`` cells (stop None: open).
+
+    The finest precision that fits is used and neighbouring cells that are
+    adjacent in geohash order are merged. Returns None when even the coarsest
+    cells cannot cover the box within ``max_cells`` (about half the world).
+    """
+    west, south, east, north = bbox
+    lon_spans = [(west, east)] if west <= east else [(west, 180.0), (-180.0, east)]
+    best = None
+    for precision in range(1, GEOHASH_PRECISION + 1):
+        columns, rows = _grid(precision)
+        lat_rows = _spans(south, north, rows, -90.0, 180.0)
+        lon_columns = [c for low, high in lon_spans for c in _spans(low, high, columns, -180.0, 360.0)]
+        if len(lat_rows) * len(lon_columns) > max_cells:
+            break
+        best = precision, columns, rows, lat_rows, lon_columns
+    if best is None:
+        return None
+    precision, columns, rows, lat_rows, lon_columns = best
+    width, height = 360.0 / columns, 180.0 / rows
+    # A cell's centre hashes to the cell itself
+    cells = sorted({geohash(-90.0 + (r + 0.5) * height, -180.0 + (c + 0.5) * width, precision)
+                    for r in lat_rows for c in lon_columns})
+    ranges = []
+    for cell in cells:
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = _next_prefix(cell)
+        else:
+            ranges.append([cell, _next_prefix(cell)])
+    return [tuple(r) for r in ranges]
+
+def _in_bbox(bbox):
+    west, south, east, north = bbox
+    latitude, longitude = CitySummary.latitude, CitySummary.longitude
+    if west <= east:
+        lon_filter = longitude.between(west, east)
+    else:
+        lon_filter = or_(longitude >= west, longitude <= east)
+    conditions = [CitySummary.geohash.isnot(None)]
+    ranges = cover_ranges(bbox)
+    if ranges is not None:
+        # Range scans on ix_city_summary_geohash; the cells overhang the box,
+        # so the exact coordinates are checked on the rows they return
+        conditions.append(or_(*(and_(CitySummary.geohash >= start, CitySummary.geohash < stop)
+                                if stop else CitySummary.geohash >= start
+                                for start, stop in ranges)))
+    return conditions + [latitude.between(south, north), lon_filter]
+
+def viewport(bbox, zoom, risk=None, max_zoom=DEFAULT_CLUSTER_MAX_ZOOM, max_cities=DEFAULT_MAX_CITIES):
+    """Map features for the cities inside ``bbox``: geohash-cell clusters below ``max_zoom``, cities above.
+
+    Clusters carry their city count, mean position, latest-week cases, peak
+    R(t) and cities per risk level; a cluster of one also carries its city id.
+    """
+    conditions = _in_bbox(bbox)
+    if risk:
+        conditions.append(CitySummary.risk_level == risk)
+    if zoom >= max_zoom:
+        return {"clustered": False, **_cities(conditions, max_cities)}
+    precision = cluster_precision(zoom)
+    cell = func.substr(CitySummary.geohash, 1, precision)
+    risk_counts = [func.sum(case((CitySummary.risk_level == level, 1), else_=0)).label(level.lower())
+                   for level in RISK_LEVELS]
+    rows = db.session.execute(
+        select(cell.label("cell"), func.count().label("cities"), func.min(CitySummary.city_id).label("city_id"),
+               func.avg(CitySummary.latitude).label("latitude"), func.avg(CitySummary.longitude).label("longitude"),
+               func.coalesce(func.sum(CitySummary.last_cases), 0).label("last_cases"),
+               func.max(CitySummary.rt).label("max_rt"), *risk_counts)
+        .where(*conditions)
+        .group_by(cell)
+    ).all()
+    features = [{
+        "cell": r.cell,
+        "cities": r.cities,
+        "city_id": r.city_id if r.cities == 1 else None,
+        "latitude": round(r.latitude, 5),
+        "longitude": round(r.longitude, 5),
+        "last_cases": int(r.last_cases),
+        "max_rt": r.max_rt,
+        "risk": {level: getattr(r, level.lower()) or 0 for level in RISK_LEVELS},
+    } for r in rows]
+    return {"clustered": True, "precision": precision, "features": features, "truncated": False}
+
+def _cities(conditions, limit):
+    rows = db.session.execute(
+        select(City.id, City.name, City.state, City.country, CitySummary.latitude, CitySummary.longitude,
+               CitySummary.last_week_label, CitySummary.last_cases, CitySummary.growth, CitySummary.rt,
+               CitySummary.risk_level)
+        .select_from(CitySummary)
+        .join(City, City.id == CitySummary.city_id)
+        .where(*conditions)
+        # Highest R(t) first, so a truncated viewport keeps the cities that matter most
+        .order_by(CitySummary.rt.is_(None), CitySummary.rt.desc(), CitySummary.city_id)
+        .limit(limit + 1)
+    ).all()
+    features = [dict(r._mapping) for r in rows[:limit]]
+    return {"features": features, "truncated": len(rows) > limit}
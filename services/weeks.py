@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# 'Wk 40', 'Week 40', 'W40', '40', '2024-W05', '2024 W5', '2024-05'
+WEEK_PATTERN = r"^(?:(?P<year>\d{4})[-\s/]*)?(?:w(?:ee)?k?s?\.?\s*)?(?P<week>\d{1,2})$"
+
+# A drop of more than half a season in the week number means a new year started
+# (e.g. 'Wk 52' followed by 'Wk 2'); smaller drops are just out-of-order rows.
+WRAP_THRESHOLD = 26
+# Stored weeks at the end of a series an appended file may line up with
+APPEND_TAIL_WEEKS = WRAP_THRESHOLD
+
+def _parse(labels: pd.Series):
+    """(week, year) number Series of ``labels``, or None when any label is not a week label"""
+    parts = labels.astype(str).str.strip().str.lower().str.extract(WEEK_PATTERN)
+    week = pd.to_numeric(parts["week"])
+    if week.isna().any() or not week.between(1, 53).all():
+        return None
+    return week, pd.to_numeric(parts["year"])
+
+def week_index(labels: pd.Series, previous=None) -> np.ndarray:
+    """Sortable chronological key for a city's week labels, given in upload order.
+
+    Keys are ``year * 100 + week``. Labels without a year get a season
+    counter instead, bumped whenever the week number wraps around.
+    ``previous`` is the key of the week preceding ``labels`` (if any) so a
+    series can be indexed chunk by chunk. Labels that cannot be parsed
+    keep their upload order.
+    """
+    parsed = _parse(labels)
+    if parsed is None:
+        start = previous + 1 if previous is not None else 0
+        return np.arange(start, start + len(labels), dtype="int64")
+    week, year = parsed
+    week = week.to_numpy(dtype="int64")
+    if year.notna().all():
+        return year.to_numpy(dtype="int64") * 100 + week
+
+    wraps = np.concatenate([[0], np.cumsum(np.diff(week) < -WRAP_THRESHOLD)])
+    season = 0
+    if previous is not None:
+        season = previous // 100
+        if week[0] < previous % 100 - WRAP_THRESHOLD:
+            season += 1
+    return (season + wraps) * 100 + week
+
+def append_week_index(labels: pd.Series, stored_keys, stored_labels, previous=None) -> np.ndarray:
+    """week_index of ``labels`` appended to a series whose keys/labels are already stored.
+
+    ``stored_keys`` is the city's keys in chronological order and
+    ``stored_labels`` maps each stored label to its latest key.
+
+    - Yearless week labels are placed at the season where they overlap the
+      most stored weeks among the last APPEND_TAIL_WEEKS, so a cumulative
+      re-upload or a correction across the new year updates those weeks.
+      Without any overlap they continue after the latest week. ``previous``
+      (the key before ``labels``, from an earlier chunk) skips the search.
+    - Labels with a year are absolute keys already.
+    - Labels that are not week labels (e.g. dates) take the stored key of
+      the same label; unseen ones get new keys after the latest and are
+      added to ``stored_labels`` for the next chunk.
+    """
+    parsed = _parse(labels)
+    last = int(stored_keys[-1]) if len(stored_keys) else None
+    if parsed is None:
+        next_key = max(k for k in (last, previous, -1) if k is not None)
+        keys = np.empty(len(labels), dtype="int64")
+        for position, label in enumerate(labels.astype(str).str.strip()):
+            if label not in stored_labels:
+                next_key += 1
+                stored_labels[label] = next_key
+            keys[position] = stored_labels[label]
+        return keys
+    if previous is not None or last is None or parsed[1].notna().all():
+        return week_index(labels, previous if previous is not None else last)
+
+    relative = week_index(labels)
+    tail = np.asarray(stored_keys[-APPEND_TAIL_WEEKS:], dtype="int64")
+    # Season shift that lines each label up with each stored week of the same number
+    same_week = relative[:, None] % 100 == tail[None, :] % 100
+    shifts = (tail[None, :] // 100 - relative[:, None] // 100)[same_week]
+    if not len(shifts):
+        return week_index(labels, last)
+    candidates = np.unique(shifts)
+    overlap = [np.isin(relative + 100 * shift, tail).sum() for shift in candidates]
+    # Most overlap wins; ties go to the latest season
+    best = candidates[len(candidates) - 1 - int(np.argmax(overlap[::-1]))]
+    return relative + 100 * int(best)
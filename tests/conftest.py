@@ -0,0 +1,87 @@
+import io
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The database location is read from the environment when config is imported
+_workdir = tempfile.mkdtemp(prefix="sante-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(_workdir, "test.db")
+
+from werkzeug.security import generate_password_hash
+from app import create_app
+from models import db, User
+from services import forecasting, kepler
+from services.report_generator import get_generator
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, INGEST_ASYNC=False, METRICS_ENABLED=False,
+                      UPLOAD_FOLDER=os.path.join(_workdir, "uploads"), JOB_FOLDER=os.path.join(_workdir, "jobs"))
+    return app
+
+@pytest.fixture
+def db_app(app):
+    """App context over an empty database"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        forecasting._forecast_cache.clear()
+        kepler._payload_cache.clear()
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(db_app):
+    db.session.add(User(username="test", password_hash=generate_password_hash("test")))
+    db.session.commit()
+    client = db_app.test_client()
+    client.post("/login", data={"username": "test", "password": "test"})
+    return client
+
+def csv_bytes(city, weeks, state="PE", country="Brazil"):
+    """CSV upload body for one city from (week_label, cases) pairs"""
+    lines = ["city,state,country,week_label,cases"]
+    lines += [f"{city},{state},{country},{label},{cases}" for label, cases in weeks]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+def ingest(data, mode="replace", **kwargs):
+    from services.csv_loader import ingest_csv
+    return ingest_csv(io.BytesIO(data), mode=mode, **kwargs)
+
+class FakeOpenAI:
+    """Stands in for the OpenAI client: canned replies, every request recorded"""
+
+    def __init__(self, reply="Report text.", chunks=("Report ", "text."), error=None):
+        self.reply, self.chunks, self.error = reply, list(chunks), error
+        self.requests = []
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, stream=False, **request):
+        self.requests.append(request)
+        if self.error is not None:
+            raise self.error
+        if stream:
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                         for text in self.chunks])
+        message = SimpleNamespace(content=self.reply)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def openai_stub(db_app, monkeypatch):
+    """Configured API key with the shared client replaced by a FakeOpenAI"""
+    fake = FakeOpenAI()
+    generator = get_generator()
+    monkeypatch.setitem(db_app.config, "OPENAI_API_KEY", "test-key")
+    monkeypatch.setattr(generator, "api_key", "test-key")
+    monkeypatch.setattr(generator, "_client", fake)
+    return fake
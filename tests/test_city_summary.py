@@ -0,0 +1,32 @@
+from services.city_summary import summary_page
+from tests.conftest import csv_bytes, ingest
+
+def _cities(last_cases):
+    for n, cases in enumerate(last_cases):
+        ingest(csv_bytes(f"City{n}", [("Wk 1", 5), ("Wk 2", cases)]))
+
+def _all_pages(**kwargs):
+    seen, after = [], None
+    while True:
+        rows, after = summary_page(after=after, limit=2, **kwargs)
+        seen += [(city.id, summary.last_cases) for city, summary in rows]
+        if after is None:
+            return seen
+
+def test_keyset_pages_cover_every_city_once_in_rank_order(db_app):
+    # Ties on the sort key are broken by city id
+    _cities([30, 70, 50, 70, 10, 50, 90])
+
+    pages = _all_pages(sort="cases")
+
+    assert [cases for _, cases in pages] == [90, 70, 70, 50, 50, 30, 10]
+    assert len({city_id for city_id, _ in pages}) == 7
+    tied = [city_id for city_id, cases in pages if cases == 70]
+    assert tied == sorted(tied, reverse=True)
+
+def test_recent_sort_pages_newest_first(db_app):
+    _cities([1, 2, 3, 4, 5])
+
+    ids = [city_id for city_id, _ in _all_pages(sort="recent")]
+
+    assert len(ids) == 5 and len(set(ids)) == 5
@@ -0,0 +1,25 @@
+import numpy as np
+from services.downsample import lttb_indices, window_slice
+
+def test_lttb_keeps_the_endpoints_and_the_requested_count():
+    values = np.sin(np.linspace(0, 20, 500)) * 100 + np.arange(500)
+
+    kept = lttb_indices(values, 50)
+
+    assert len(kept) == 50
+    assert kept[0] == 0 and kept[-1] == 499
+    assert np.all(np.diff(kept) > 0)
+
+def test_lttb_keeps_a_single_spike():
+    values = np.zeros(200)
+    values[123] = 1000
+
+    assert 123 in lttb_indices(values, 10)
+
+def test_lttb_returns_short_series_whole():
+    assert lttb_indices([1, 2, 3], 10).tolist() == [0, 1, 2]
+
+def test_window_slice_is_positional_and_inclusive():
+    assert window_slice(10, 3, 5) == slice(3, 6)
+    assert window_slice(10) == slice(0, 10)
+    assert window_slice(10, 7) == slice(7, 10)
@@ -0,0 +1,29 @@
+import numpy as np
+from services.forecasting import forecast_matrix, forecast_series
+
+def test_holt_fits_its_smoothing_to_a_surge():
+    forecast = forecast_series([200, 150, 100, 60, 30, 40, 99], "holt", 3, 0.8)
+
+    # Fixed constants lagged behind the jump and forecast a decline
+    assert forecast["point"][0] > 99
+    assert forecast["point"] == sorted(forecast["point"])
+
+def test_holt_tracks_a_straight_line_exactly():
+    forecast = forecast_series([10, 20, 30, 40, 50, 60, 70, 80], "holt", 3, 0.8)
+
+    assert forecast["point"] == [90, 100, 110]
+
+def test_holt_rows_are_fitted_independently():
+    series = [[0, 0, 5, 9, 14, 30, 55], [40, 42, 41, 39, 40, 41, 40]]
+    matrix = np.asarray(series, dtype="float64")
+    batch = forecast_matrix(matrix, [5, 7], "holt", 3, 0.8)
+
+    single = forecast_matrix(matrix[:1, 2:], [5], "holt", 3, 0.8)
+
+    assert np.allclose(batch["point"][0], single["point"][0])
+
+def test_explicit_zero_interval_is_kept():
+    forecast = forecast_series([10, 20, 30, 25, 40], "holt", 2, 0)
+
+    assert forecast["interval"] == 0
+    assert forecast["lower"] == forecast["point"] == forecast["upper"]
@@ -0,0 +1,21 @@
+from models import db, City, Place
+from services.gazetteer import geocode_cities
+from tests.conftest import csv_bytes, ingest
+
+def test_moving_a_city_bumps_its_data_version(db_app):
+    city_ids, _ = ingest(csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)]))
+    db.session.commit()
+    city = db.session.get(City, city_ids[0])
+    assert city.latitude is not None
+    version = city.data_version
+
+    # Re-resolving unchanged coordinates leaves the version alone
+    assert geocode_cities(overwrite=True) == 0
+    place = Place.query.filter_by(name_key="recife").first()
+    place.latitude += 0.5
+    assert geocode_cities(overwrite=True) == 1
+    db.session.commit()
+
+    db.session.refresh(city)
+    assert city.data_version == version + 1
+    assert city.latitude == place.latitude
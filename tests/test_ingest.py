@@ -0,0 +1,135 @@
+import hashlib
+import os
+from models import db, City, CitySummary, Indicator, Observation, UploadedFile
+from services.series_store import city_series
+from tests.conftest import ROOT, csv_bytes, ingest
+
+def _seasons():
+    """Wk 40-52, then a full season, then Wk 1-10: 75 weeks whose labels repeat"""
+    weeks = [f"Wk {w}" for w in range(40, 53)] + [f"Wk {w}" for w in range(1, 53)] + [f"Wk {w}" for w in range(1, 11)]
+    return [(label, 100 + i) for i, label in enumerate(weeks)]
+
+def _cases_by_idx(city_id):
+    rows = Observation.query.filter_by(city_id=city_id).all()
+    return {r.week_idx: r.cases for r in rows}
+
+def test_multi_city_file_is_grouped_per_city_in_file_order(db_app):
+    # Rows of the three cities are interleaved; Olinda comes first
+    lines = [b"city,state,country,week_label,cases"]
+    for week in range(1, 5):
+        lines += [f"Olinda,PE,Brazil,Wk {week},{week}".encode(),
+                  f"Recife,PE,Brazil,Wk {week},{10 * week}".encode(),
+                  f"Lima,,Peru,Wk {week},{100 * week}".encode()]
+
+    city_ids, stats = ingest(b"\n".join(lines) + b"\n")
+
+    assert [db.session.get(City, city_id).name for city_id in city_ids] == ["Olinda", "Recife", "Lima"]
+    assert (stats["cities"], stats["rows"], stats["inserted"]) == (3, 12, 12)
+    assert [city_series(city_id).cases.tolist() for city_id in city_ids] == [
+        [1, 2, 3, 4], [10, 20, 30, 40], [100, 200, 300, 400]]
+    summaries = {s.city_id: s for s in CitySummary.query.all()}
+    assert [summaries[city_id].last_cases for city_id in city_ids] == [4, 40, 400]
+    assert {i.city_id for i in Indicator.query.all()} == set(city_ids)
+
+def test_city_spanning_chunks_keeps_its_season_hash_and_dedup(db_app):
+    # Chunks of three rows: the new year (Wk 52 -> Wk 1) falls on a chunk boundary
+    data = csv_bytes("Recife", [("Wk 50", 1), ("Wk 51", 2), ("Wk 52", 3), ("Wk 1", 4), ("Wk 2", 5)])
+
+    city_ids, stats = ingest(data, chunk_rows=3)
+
+    assert stats["rows"] == 5
+    assert sorted(_cases_by_idx(city_ids[0])) == [50, 51, 52, 101, 102]
+    assert UploadedFile.query.one().sha256 == hashlib.sha256(data).hexdigest()
+    # Same bytes read in different chunks are still the same upload
+    _, again = ingest(data, chunk_rows=2)
+    assert again["skipped"]
+
+def test_append_adds_a_week_after_the_latest_season(db_app):
+    city_ids, _ = ingest(csv_bytes("Recife", _seasons()))
+    before = _cases_by_idx(city_ids[0])
+
+    _, stats = ingest(csv_bytes("Recife", [("Wk 11", 999)]), mode="append")
+
+    assert (stats["inserted"], stats["updated"]) == (1, 0)
+    packed = city_series(city_ids[0])
+    assert len(packed.cases) == 76
+    assert packed.labels[-1] == "Wk 11" and packed.cases[-1] == 999
+    after = _cases_by_idx(city_ids[0])
+    # Last season's Wk 11 is untouched
+    assert {idx: after[idx] for idx in before} == before
+
+def test_append_corrects_the_latest_occurrence_of_a_label(db_app):
+    city_ids, _ = ingest(csv_bytes("Recife", _seasons()))
+
+    _, stats = ingest(csv_bytes("Recife", [("Wk 9", 555), ("Wk 10", 174)]), mode="append")
+
+    # Wk 10 already holds 174 (the 75th week), so only Wk 9 changes
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (0, 1, 1)
+    packed = city_series(city_ids[0])
+    assert len(packed.cases) == 75
+    assert packed.cases[-2] == 555
+    # The first season's Wk 9 keeps its value
+    first_wk9 = Observation.query.filter_by(city_id=city_ids[0], week_label="Wk 9").order_by(Observation.week_idx).first()
+    assert first_wk9.cases == 100 + 13 + 8
+    assert db.session.query(Observation).count() == 75
+
+def test_cumulative_reupload_updates_the_history_and_adds_the_new_week(db_app):
+    with open(os.path.join(ROOT, "static", "sample_data.csv"), "rb") as fh:
+        sample = fh.read()
+    city_ids, _ = ingest(sample)
+
+    _, stats = ingest(sample + b"Recife,PE,Brazil,Wk 8,1700\n", mode="append")
+
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (1, 0, 10)
+    packed = city_series(city_ids[0])
+    assert len(packed.cases) == 11
+    assert packed.labels[-2:] == ["Wk 6", "Wk 8"] and packed.cases[-1] == 1700
+
+def test_append_correction_across_the_new_year(db_app):
+    city_ids, _ = ingest(csv_bytes("Recife", [("Wk 50", 5), ("Wk 51", 6), ("Wk 52", 7), ("Wk 1", 8)]))
+
+    _, stats = ingest(csv_bytes("Recife", [("Wk 52", 70), ("Wk 1", 80), ("Wk 2", 90)]), mode="append")
+
+    assert (stats["inserted"], stats["updated"]) == (1, 2)
+    assert sorted(_cases_by_idx(city_ids[0]).items()) == [(50, 5), (51, 6), (52, 70), (101, 80), (102, 90)]
+
+def test_append_matches_date_labels(db_app):
+    weeks = [("2024-01-07", 10), ("2024-01-14", 20), ("2024-01-21", 30)]
+    city_ids, _ = ingest(csv_bytes("Recife", weeks))
+
+    _, stats = ingest(csv_bytes("Recife", weeks[1:] + [("2024-01-28", 40)]), mode="append")
+
+    assert (stats["inserted"], stats["updated"], stats["unchanged"]) == (1, 0, 2)
+    packed = city_series(city_ids[0])
+    assert packed.labels == ["2024-01-07", "2024-01-14", "2024-01-21", "2024-01-28"]
+    assert packed.cases.tolist() == [10, 20, 30, 40]
+
+def test_identical_upload_is_skipped_and_its_copy_removed(db_app, tmp_path):
+    data = csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)])
+    ingest(data)
+    copy = tmp_path / "again.csv"
+
+    city_ids, stats = ingest(data, save_path=str(copy))
+
+    assert stats["skipped"] and city_ids == []
+    assert not copy.exists()
+    assert db.session.query(Observation).count() == 2
+
+def test_reuploading_an_older_file_reverts_the_city(db_app):
+    first = csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)])
+    city_ids, _ = ingest(first)
+    ingest(csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20), ("Wk 3", 30)]))
+
+    _, stats = ingest(first)
+
+    assert not stats["skipped"]
+    assert city_series(city_ids[0]).cases.tolist() == [10, 20]
+
+def test_dedup_is_scoped_to_the_upload_mode(db_app):
+    data = csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)])
+    ingest(data)
+
+    _, stats = ingest(data, mode="append")
+
+    assert not stats["skipped"]
+    assert stats["unchanged"] == 2
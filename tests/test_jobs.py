@@ -0,0 +1,63 @@
+import io
+import os
+import time
+import pytest
+from controllers.cities import _ingest_job
+from services.jobs import JobStore, get_queue
+from tests.conftest import csv_bytes
+
+def _age(store, job_id, seconds):
+    for name in os.listdir(store.root):
+        if name.startswith(job_id):
+            path = os.path.join(store.root, name)
+            os.utime(path, (time.time() - seconds, time.time() - seconds))
+
+def test_expire_removes_old_finished_jobs_and_their_artifacts(tmp_path):
+    store = JobStore(str(tmp_path))
+    old_done = store.create("reports", status="done")
+    open(store.artifact_path(old_done["id"], ".zip"), "wb").close()
+    old_running = store.create("ingest", status="running")
+    recent_done = store.create("ingest", status="done")
+    _age(store, old_done["id"], 7200)
+    _age(store, old_running["id"], 7200)
+
+    assert store.expire(3600) == 1
+
+    assert sorted(os.listdir(tmp_path)) == sorted([f"{old_running['id']}.json", f"{recent_done['id']}.json"])
+    assert store.get(old_done["id"]) is None
+
+def _saved_upload(app, data):
+    folder = app.config["UPLOAD_FOLDER"]
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, "upload.csv")
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return path
+
+def test_ingest_job_deletes_the_saved_upload(db_app):
+    job = get_queue().create("ingest")
+    path = _saved_upload(db_app, csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)]))
+
+    result = _ingest_job(job["id"], path, "replace", "upload.csv")
+
+    assert result["stats"]["inserted"] == 2
+    assert not os.path.exists(path)
+
+def test_failed_ingest_job_deletes_the_saved_upload(db_app):
+    job = get_queue().create("ingest")
+    path = _saved_upload(db_app, b"not,a,case,file\n")
+
+    with pytest.raises(Exception):
+        _ingest_job(job["id"], path, "replace", "upload.csv")
+
+    assert not os.path.exists(path)
+
+def test_sync_upload_leaves_no_copy_behind(client, db_app):
+    data = csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)])
+
+    response = client.post("/cities/upload", data={"file": (io.BytesIO(data), "upload.csv"), "mode": "replace"},
+                           content_type="multipart/form-data")
+
+    assert response.status_code == 302 and "/dashboard/" in response.headers["Location"]
+    folder = db_app.config["UPLOAD_FOLDER"]
+    assert not os.path.isdir(folder) or os.listdir(folder) == []
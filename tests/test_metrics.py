@@ -0,0 +1,15 @@
+def test_metrics_require_login(db_app):
+    response = db_app.test_client().get("/metrics")
+
+    assert response.status_code == 302 and "/login" in response.headers["Location"]
+
+def test_metrics_for_a_logged_in_user(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert "sante_http_request_duration_seconds" in response.get_data(as_text=True)
+
+def test_metrics_public_opts_out_of_login(db_app, monkeypatch):
+    monkeypatch.setitem(db_app.config, "METRICS_PUBLIC", True)
+
+    assert db_app.test_client().get("/metrics").status_code == 200
@@ -0,0 +1,26 @@
+import io
+import zipfile
+from models import db, CachedReport
+from services import report_batch
+from services.report_generator import get_generator
+from tests.conftest import csv_bytes, ingest
+
+def _cities(count):
+    for n in range(count):
+        ingest(csv_bytes(f"City{n}", [("Wk 1", 10 + n), ("Wk 2", 20 + n), ("Wk 3", 30 + n)]))
+
+def test_batch_larger_than_the_cache_keeps_every_report(db_app, monkeypatch):
+    db_app.config["REPORT_CACHE_MAX_ENTRIES"] = 3
+    monkeypatch.setattr(get_generator(), "api_key", "test-key")
+    monkeypatch.setattr(report_batch, "_complete", lambda *args, **kwargs: "report")
+    _cities(5)
+
+    result = report_batch.generate_reports(concurrency=2)
+
+    assert result["generated"] == 5 and len(result["reports"]) == 5
+    # The batch's own entries survive the cap until the next regular store
+    assert db.session.query(CachedReport).count() == 5
+    buffer = io.BytesIO()
+    report_batch.write_reports_zip(result["reports"], buffer)
+    with zipfile.ZipFile(buffer) as archive:
+        assert len(archive.namelist()) == 5
@@ -0,0 +1,41 @@
+from flask import Flask
+from services import report_generator
+from services.report_generator import ReportGenerator
+
+class _Client:
+    built = 0
+
+    def __init__(self, **kwargs):
+        _Client.built += 1
+        self.kwargs = kwargs
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+def test_client_is_built_once_and_reused(monkeypatch):
+    monkeypatch.setattr(report_generator, "OpenAI", _Client)
+    monkeypatch.setattr(_Client, "built", 0)
+    generator = ReportGenerator({"OPENAI_API_KEY": "test-key", "OPENAI_POOL_SIZE": 4})
+
+    first = generator.client
+
+    assert generator.client is first and generator.client is first
+    assert _Client.built == 1
+    assert first.kwargs["max_retries"] == report_generator.DEFAULT_MAX_RETRIES
+
+def test_close_runs_at_teardown_and_releases_the_client(monkeypatch):
+    monkeypatch.setattr(report_generator, "OpenAI", _Client)
+    registered = []
+    monkeypatch.setattr(report_generator.atexit, "register", registered.append)
+    app = Flask(__name__)
+    app.config["OPENAI_API_KEY"] = "test-key"
+    report_generator.init_app(app)
+    generator = app.extensions["report_generator"]
+    client = generator.client
+
+    for callback in registered:
+        callback()
+
+    assert client.closed
+    assert generator._client is None
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+import pytest
+from models import CachedReport
+from services import report_store
+from services.report_store import get_report, store_report
+from tests.conftest import csv_bytes, ingest
+
+class _Clock(datetime):
+    current = datetime(2026, 1, 1)
+
+    @classmethod
+    def utcnow(cls):
+        return cls.current
+
+@pytest.fixture
+def clock(monkeypatch):
+    monkeypatch.setattr(_Clock, "current", datetime(2026, 1, 1))
+    monkeypatch.setattr(report_store, "datetime", _Clock)
+    return _Clock
+
+def test_report_expires_after_the_ttl(db_app, clock, monkeypatch):
+    monkeypatch.setitem(db_app.config, "REPORT_CACHE_TTL", 3600)
+    store_report("a", 1, "model", "text")
+
+    clock.current += timedelta(seconds=3599)
+    assert get_report("a") == "text"
+    clock.current += timedelta(seconds=2)
+
+    assert get_report("a") is None
+    assert CachedReport.query.count() == 0
+
+def test_least_recently_used_report_is_evicted_past_the_cap(db_app, clock, monkeypatch):
+    monkeypatch.setitem(db_app.config, "REPORT_CACHE_MAX_ENTRIES", 2)
+    store_report("a", 1, "model", "A")
+    clock.current += timedelta(seconds=1)
+    store_report("b", 1, "model", "B")
+    clock.current += timedelta(seconds=1)
+    # Reading "a" makes "b" the least recently used
+    assert get_report("a") == "A"
+    clock.current += timedelta(seconds=1)
+
+    store_report("c", 1, "model", "C")
+
+    assert {r.fingerprint for r in CachedReport.query.all()} == {"a", "c"}
+
+def test_regenerate_bypasses_the_cache(client, openai_stub):
+    city_ids, _ = ingest(csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20), ("Wk 3", 30)]))
+    url = f"/dashboard/{city_ids[0]}/generate-report"
+
+    client.post(url)
+    client.post(url)
+    assert len(openai_stub.requests) == 1
+
+    openai_stub.reply = "Fresh text."
+    response = client.post(url, data={"regenerate": "1"})
+
+    assert len(openai_stub.requests) == 2
+    assert b"Fresh text." in response.data
+    assert get_report(CachedReport.query.one().fingerprint) == "Fresh text."
@@ -0,0 +1,44 @@
+import json
+from models import CachedReport
+from services.report_store import get_report
+from tests.conftest import csv_bytes, ingest
+
+def _events(response):
+    """(event, data) pairs of a Server-Sent Events body"""
+    events = []
+    for block in response.get_data(as_text=True).strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+def _city():
+    city_ids, _ = ingest(csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20), ("Wk 3", 30)]))
+    return city_ids[0]
+
+def test_chunks_stream_in_order_then_done_and_the_text_is_stored(client, openai_stub):
+    openai_stub.chunks = ["Cases ", "are ", "rising."]
+    city_id = _city()
+
+    response = client.get(f"/dashboard/{city_id}/report-stream")
+
+    assert response.mimetype == "text/event-stream"
+    assert _events(response) == [("chunk", {"text": "Cases "}), ("chunk", {"text": "are "}),
+                                 ("chunk", {"text": "rising."}), ("done", {})]
+    assert get_report(CachedReport.query.one().fingerprint) == "Cases are rising."
+    # The stored text is replayed as a single chunk without another API call
+    again = _events(client.get(f"/dashboard/{city_id}/report-stream"))
+    assert again == [("chunk", {"text": "Cases are rising."}), ("done", {})]
+    assert len(openai_stub.requests) == 1
+
+def test_api_failure_ends_the_stream_with_an_error_event(client, openai_stub):
+    openai_stub.error = RuntimeError("rate limited")
+    city_id = _city()
+
+    events = _events(client.get(f"/dashboard/{city_id}/report-stream"))
+
+    assert [event for event, _ in events] == ["error"]
+    assert "rate limited" in events[0][1]["message"]
+    assert CachedReport.query.count() == 0
+
+def test_unknown_city_is_an_error_event(client, openai_stub):
+    assert _events(client.get("/dashboard/999/report-stream")) == [("error", {"message": "City not found"})]
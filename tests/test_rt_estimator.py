@@ -0,0 +1,36 @@
+import numpy as np
+from services.rt_estimator import DEFAULT_SI_MEAN, DEFAULT_SI_SD, DEFAULT_WINDOW, estimate_rt, serial_interval_weights
+
+SETTINGS = {"si_mean": DEFAULT_SI_MEAN, "si_sd": DEFAULT_SI_SD, "window": DEFAULT_WINDOW}
+
+def test_constant_growth_recovers_the_renewal_equation_r():
+    growth = 1.3
+    cases = 1000.0 * growth ** np.arange(40)
+    weights = serial_interval_weights(DEFAULT_SI_MEAN, DEFAULT_SI_SD)
+    # c[t] = R * sum_s w[s] c[t - s]  =>  R = 1 / sum_s w[s] g^-s
+    expected = 1.0 / np.sum(weights * growth ** -np.arange(1, len(weights) + 1))
+
+    estimate = estimate_rt(cases, SETTINGS)
+
+    tail = estimate["mean"][-10:]
+    assert np.allclose(tail, expected, rtol=1e-3)
+    assert np.all(estimate["lower"][-10:] < tail) and np.all(tail < estimate["upper"][-10:])
+
+def test_flat_series_is_at_replacement():
+    estimate = estimate_rt([500] * 30, SETTINGS)
+
+    assert abs(estimate["mean"][-1] - 1.0) < 0.01
+
+def test_accepts_numpy_lists_and_empty_input():
+    as_array = estimate_rt(np.array([10, 20, 40, 80, 160, 320]), SETTINGS)
+    as_list = estimate_rt([10, 20, 40, 80, 160, 320], SETTINGS)
+
+    assert np.allclose(as_array["mean"], as_list["mean"], equal_nan=True)
+    assert len(estimate_rt(None, SETTINGS)["mean"]) == 0
+    assert len(estimate_rt(np.array([]), SETTINGS)["mean"]) == 0
+
+def test_weeks_before_a_full_window_are_undefined():
+    estimate = estimate_rt([10, 20, 40, 80, 160, 320], SETTINGS)
+
+    assert np.isnan(estimate["mean"][:DEFAULT_WINDOW]).all()
+    assert not np.isnan(estimate["mean"][-1])
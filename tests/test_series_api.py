@@ -0,0 +1,66 @@
+from tests.conftest import csv_bytes, ingest
+
+def _two_seasons():
+    """Wk 45-52 then Wk 1-52: labels Wk 45-52 occur twice"""
+    weeks = [f"Wk {w}" for w in range(45, 53)] + [f"Wk {w}" for w in range(1, 53)]
+    return [(label, 10 + i) for i, label in enumerate(weeks)]
+
+def test_zoom_across_the_new_year_uses_positions(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+
+    # Wk 50 (position 5) through Wk 3 (position 10)
+    response = client.get(f"/api/cities/{city_ids[0]}/series?from=5&to=10&points=0")
+
+    assert response.status_code == 200
+    series = response.get_json()
+    assert series["weeks"] == ["Wk 50", "Wk 51", "Wk 52", "Wk 1", "Wk 2", "Wk 3"]
+    assert series["positions"] == [5, 6, 7, 8, 9, 10]
+    assert series["cases"] == [15, 16, 17, 18, 19, 20]
+    assert series["window"]["latest"] is False
+
+def test_second_occurrence_of_a_label_is_reachable(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+
+    series = client.get(f"/api/cities/{city_ids[0]}/series?from=55&points=0").get_json()
+
+    assert series["weeks"][0] == "Wk 48" and series["cases"][0] == 65
+    assert series["window"]["latest"] is True
+
+def test_invalid_windows_and_point_counts_are_rejected(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+    url = f"/api/cities/{city_ids[0]}/series"
+
+    assert client.get(f"{url}?from=10&to=5").status_code == 400
+    assert client.get(f"{url}?from=60").status_code == 400
+    for points in (1, 2, -1):
+        assert client.get(f"{url}?points={points}").status_code == 400
+    assert len(client.get(f"{url}?points=3").get_json()["weeks"]) == 3
+
+def test_unchanged_city_revalidates_to_304(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+    url = f"/api/cities/{city_ids[0]}/series"
+
+    first = client.get(url)
+    again = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert again.status_code == 304 and again.headers["ETag"] == first.headers["ETag"]
+
+def test_ingest_changes_the_etag(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+    url = f"/api/cities/{city_ids[0]}/series"
+    etag = client.get(url).headers["ETag"]
+
+    ingest(csv_bytes("Recife", [("Wk 53", 99)]), mode="append")
+    response = client.get(url, headers={"If-None-Match": etag})
+
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert response.get_json()["cases"][-1] == 99
+
+def test_bad_window_is_rejected_even_with_a_matching_etag(client):
+    city_ids, _ = ingest(csv_bytes("Recife", _two_seasons()))
+    url = f"/api/cities/{city_ids[0]}/series"
+
+    # "*" matches any tag, so only validation can turn this into an error
+    assert client.get(f"{url}?from=70", headers={"If-None-Match": "*"}).status_code == 400
+    assert client.get(f"{url}?points=2", headers={"If-None-Match": "*"}).status_code == 400
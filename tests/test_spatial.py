@@ -0,0 +1,36 @@
+import random
+from models import db, City
+from services.city_summary import refresh_summaries
+from services.spatial import cover_ranges, geohash, viewport
+from tests.conftest import csv_bytes, ingest
+
+def _inside(ranges, point_hash):
+    return any(point_hash >= start and (stop is None or point_hash < stop) for start, stop in ranges)
+
+def test_cover_ranges_contain_every_point_of_the_box():
+    rng = random.Random(7)
+    for bbox in [(-35.5, -8.5, -34.5, -7.5), (170.0, -10.0, -170.0, 10.0), (-74.0, -34.0, -34.0, 5.0), (0.0, 0.0, 0.001, 0.001)]:
+        west, south, east, north = bbox
+        ranges = cover_ranges(bbox)
+        assert ranges
+        for _ in range(200):
+            lon = rng.uniform(west, east) if west <= east else rng.choice([rng.uniform(west, 180.0), rng.uniform(-180.0, east)])
+            assert _inside(ranges, geohash(rng.uniform(south, north), lon))
+
+def test_cover_ranges_give_up_on_half_the_world():
+    assert cover_ranges((-180.0, -90.0, 180.0, 90.0)) is None
+
+def test_viewport_keeps_only_cities_inside_the_box(db_app):
+    city_ids, _ = ingest(csv_bytes("Recife", [("Wk 1", 10), ("Wk 2", 20)]) +
+                         csv_bytes("Olinda", [("Wk 1", 5), ("Wk 2", 6)]).split(b"\n", 1)[1])
+    for city_id, (lat, lon) in zip(city_ids, [(-8.05, -34.9), (-7.99, -34.84)]):
+        city = db.session.get(City, city_id)
+        city.latitude, city.longitude = lat, lon
+    refresh_summaries(city_ids)
+    db.session.commit()
+
+    result = viewport((-34.95, -8.1, -34.87, -8.0), zoom=13)
+
+    assert [f["name"] for f in result["features"]] == ["Recife"]
+    clustered = viewport((-40.0, -10.0, -30.0, 0.0), zoom=3)
+    assert sum(f["cities"] for f in clustered["features"]) == 2
@@ -0,0 +1,25 @@
+import pandas as pd
+from services.weeks import week_index
+
+def test_week_numbers_wrap_into_a_new_season():
+    keys = week_index(pd.Series(["Wk 50", "Wk 51", "Wk 52", "Wk 1", "Wk 2"]))
+
+    assert keys.tolist() == [50, 51, 52, 101, 102]
+
+def test_small_drops_are_out_of_order_rows_not_a_new_season():
+    keys = week_index(pd.Series(["Wk 10", "Wk 12", "Wk 11"]))
+
+    assert keys.tolist() == [10, 12, 11]
+
+def test_chunks_continue_from_the_previous_key():
+    first = week_index(pd.Series(["Wk 51", "Wk 52"]))
+    second = week_index(pd.Series(["Wk 1", "Wk 2"]), previous=int(first[-1]))
+
+    assert second.tolist() == [101, 102]
+    # Same season when the chunk carries on without wrapping
+    assert week_index(pd.Series(["Wk 3"]), previous=102).tolist() == [103]
+
+def test_labels_with_a_year_use_it():
+    keys = week_index(pd.Series(["2023-W52", "2024-W01"]))
+
+    assert keys.tolist() == [202352, 202401]